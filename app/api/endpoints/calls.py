@@ -2,128 +2,218 @@
 API endpoints for handling Twilio calls.
 """
 import json
-import requests
+import time
+import asyncio
+import weakref
+import functools
 from datetime import datetime
-from twilio.rest import Client
-import traceback
 from fastapi import APIRouter, Request, Response
 from xml.sax.saxutils import escape
-from app.core.shared_state import sessions
+from app.core.shared_state import Session, sessions
+from app.core.prompts import SYSTEM_MESSAGE
+from app.services.ultravox_service import create_ultravox_call
+from app.services import caller_profile
+from app.utils.ttl_cache import TTLCache
 from app.core.config import (
     PUBLIC_URL,
     DEFAULT_FIRST_MESSAGE,
     TWILIO_ACCOUNT_SID,
     TWILIO_AUTH_TOKEN,
     TWILIO_PHONE_NUMBER,
-    N8N_WEBHOOK_URL,
+    ULTRAVOX_PRECREATE_TIMEOUT,
+    GREETING_TIMEOUT,
+    GREETING_CACHE_SIZE,
+    GREETING_CACHE_TTL,
+    GREETING_CACHE_STALE_TTL,
 )
+from app.core.log import get_logger, log_payload, set_call_context
+
+logger = get_logger(__name__)
 
 router = APIRouter()
 
-# 🔍 Fetch initial greeting message from N8N
-async def get_first_message_from_n8n(caller_number: str) -> str:
-    print("\n📨 get_first_message_from_n8n() called with:", caller_number)
+# Greetings per caller number; stale entries are served while a refresh runs
+greeting_cache = TTLCache(GREETING_CACHE_SIZE, GREETING_CACHE_TTL, GREETING_CACHE_STALE_TTL)
+_greeting_watched = weakref.WeakSet()  # lookups that will fill greeting_cache
+
+
+# 🔍 Extract the initial greeting from a caller-profile lookup
+def parse_first_message(response_text: str):
+    """Greeting from n8n's route 1 response body. Returns None if n8n gave none."""
+    logger.info("📨 Raw response from N8N: %s", response_text)
     try:
-        print("🔁 Sending POST to n8n (route: 1)...")
-        webhook_response = requests.post(
-            N8N_WEBHOOK_URL,
-            headers={"Content-Type": "application/json"},
-            json={
-                "route": 1,
-                "number": caller_number,
-                "data": "empty"
-            }
-        )
-        print("🌐 N8N webhook response status:", webhook_response.status_code)
-
-        if webhook_response.ok:
-            response_text = webhook_response.text
-            print("📨 Raw response from N8N:", response_text)
-
-            try:
-                response_data = json.loads(response_text)
-                print("✅ Parsed JSON from N8N:", response_data)
-
-                if response_data.get('firstMessage'):
-                    fm = response_data['firstMessage']
-                    print("🔎 Detected firstMessage:", fm)
-
-                    if isinstance(fm, list) and len(fm) > 0 and isinstance(fm[0], dict):
-                        msg = fm[0].get("message", {})
-                        content = msg.get("content")
-                        if content:
-                            print("✅ Extracted content from n8n list format:", content)
-                            return content
-
-                    elif isinstance(fm, dict) and 'message' in fm:
-                        content = fm['message'].get('content')
-                        if content:
-                            print("✅ Extracted content from n8n object format:", content)
-                            return content
-
-                    print("⚠️ Unexpected 'firstMessage' format. Fallback to raw:", fm)
-                    return str(fm)
-
-            except json.JSONDecodeError as je:
-                print("❌ JSON decoding failed:", je)
-                return response_text.strip()
-        else:
-            print("❌ N8N webhook failed:", webhook_response.status_code, webhook_response.text)
+        response_data = json.loads(response_text)
+        logger.info("✅ Parsed JSON from N8N: %s", response_data)
 
-    except Exception as e:
-        print("❌ Exception while calling N8N webhook:", e)
+        if isinstance(response_data, dict) and response_data.get('firstMessage'):
+            fm = response_data['firstMessage']
+            logger.info("🔎 Detected firstMessage: %s", fm)
+
+            if isinstance(fm, list) and len(fm) > 0 and isinstance(fm[0], dict):
+                msg = fm[0].get("message", {})
+                content = msg.get("content")
+                if content:
+                    logger.info("✅ Extracted content from n8n list format: %s", content)
+                    return content
+
+            elif isinstance(fm, dict) and 'message' in fm:
+                content = fm['message'].get('content')
+                if content:
+                    logger.info("✅ Extracted content from n8n object format: %s", content)
+                    return content
+
+            logger.warning("⚠️ Unexpected 'firstMessage' format. Fallback to raw: %s", fm)
+            return str(fm)
+
+    except json.JSONDecodeError as je:
+        logger.error("❌ JSON decoding failed: %s", je)
+        return response_text.strip()
+
+    return None
+
+
+def start_caller_lookup(caller_number: str) -> asyncio.Task:
+    """Start (or join) the caller-profile lookup; the greeting in it is cached when it lands."""
+    task = caller_profile.lookup(caller_number)
+
+    def cache_greeting(done):
+        if done.cancelled() or not done.result() or caller_number == "Unknown":
+            return
+        message = parse_first_message(done.result())
+        if message:
+            greeting_cache.set(caller_number, message)
 
-    print("🔁 Falling back to DEFAULT_FIRST_MESSAGE.")
-    return DEFAULT_FIRST_MESSAGE
+    if task not in _greeting_watched:
+        _greeting_watched.add(task)
+        task.add_done_callback(cache_greeting)
+    return task
+
+
+async def get_first_message_from_n8n(caller_number: str):
+    """
+    Greeting for /incoming-call within GREETING_TIMEOUT: cached if possible,
+    otherwise from the caller-profile lookup, otherwise DEFAULT_FIRST_MESSAGE.
+    Returns (greeting, lookup); lookup is None when a fresh cached greeting
+    made n8n unnecessary.
+    """
+    cached, fresh = greeting_cache.get(caller_number)
+    if fresh:
+        logger.info("⚡ Greeting served from cache")
+        return cached, None
+
+    lookup = start_caller_lookup(caller_number)
+    if cached is not None:
+        # The lookup refreshes the entry in the background
+        logger.info("♻️ Serving stale greeting, refreshing from N8N in background")
+        return cached, lookup
+
+    try:
+        # shield: a late answer still lands in the cache for the caller's next call
+        response_text = await asyncio.wait_for(asyncio.shield(lookup), timeout=GREETING_TIMEOUT)
+        message = parse_first_message(response_text) if response_text else None
+        if message:
+            return message, lookup
+    except asyncio.TimeoutError:
+        logger.warning("⏳ N8N greeting lookup exceeded %ss budget", GREETING_TIMEOUT)
+
+    logger.info("🔁 Falling back to DEFAULT_FIRST_MESSAGE.")
+    return DEFAULT_FIRST_MESSAGE, lookup
+
+
+def expire_precreated_call(call_sid: str):
+    """Discard a pre-created Ultravox call whose Twilio media stream never arrived."""
+    session = sessions.get(call_sid)
+    if not session:
+        return
+    session.uv_call_expiry = None
+    uv_call_task, session.uv_call_task = session.uv_call_task, None
+    if uv_call_task is not None:
+        uv_call_task.cancel()
+        logger.warning("⌛ No media stream for CallSid=%s after %ss. Pre-created Ultravox call discarded.", call_sid, ULTRAVOX_PRECREATE_TIMEOUT)
+
+
+def _mark_call_created(session: Session, task: asyncio.Task):
+    if not task.cancelled() and task.exception() is None and task.result():
+        session.timeline.mark("ultravox_call_created")
 
 
 @router.get("/")
 async def root():
-    print("📡 GET / called — health check OK")
+    logger.info("📡 GET / called — health check OK")
     return {"message": "Twilio + Ultravox Media Stream Server is running!"}
 
 
 @router.post("/incoming-call")
 async def incoming_call(request: Request):
+    received_at = time.monotonic()
     try:
-        print("🟡 [Webhook Hit] POST /incoming-call")
+        logger.info("🟡 [Webhook Hit] POST /incoming-call")
 
+        payload_label = "📞 Parsed form data"
         try:
             content_type = request.headers.get("content-type", "")
             if "application/json" in content_type:
                 data = await request.json()
-                print("📦 Parsed JSON data:", data)
+                payload_label = "📦 Parsed JSON data"
             else:
                 form_data = await request.form()
                 data = dict(form_data)
-                print("📞 Parsed form data:", data)
         except Exception as e:
-            print("❌ Failed to parse request:", e)
+            logger.error("❌ Failed to parse request: %s", e)
             data = {}
 
         # Use `data` instead of `form_dict`
         caller_number = data.get("From", "Unknown")
         call_sid = data.get("CallSid", "Unknown")
+        set_call_context(call_sid=call_sid)
+        # Logged once the call is known, so it follows the call's payload sampling
+        log_payload(logger, payload_label, data)
 
-        # Fetch first message
-        first_message = await get_first_message_from_n8n(caller_number)
-        print("💬 First Message returned from N8N handler:", first_message)
+        # At most one caller-profile lookup per call: the greeting reads it here and the
+        # check_returning_user tool reuses it from the session (or starts it, after a fresh cache hit)
+        first_message, lookup = await get_first_message_from_n8n(caller_number)
+        greeting_resolved_at = time.monotonic()
+        logger.info("💬 First Message returned from N8N handler: %s", first_message)
 
         # Create session
+        session = None
         if call_sid and call_sid not in sessions:
-            sessions[call_sid] = {
-                "callSid": call_sid,
-                "callerNumber": caller_number,
-                "transcript": "",
-                "twilio_ws_active": False,
-                "ultravox_ws_active": False,
-                "firstMessage": first_message,
-                "transcript_sent": False
-            }
-            print(f"📦 Session created for CallSid: {call_sid}")
+            session = sessions.add(Session(
+                call_sid,
+                caller_number=caller_number,
+                first_message=first_message,
+                webhook_received_at=received_at,
+            ))
+            if session is None:
+                # Every session slot belongs to a call in progress; those are never evicted
+                logger.warning("🚫 Session store full (%s calls in progress). Refusing CallSid: %s", len(sessions), call_sid)
+                busy_twiml = """
+                <?xml version="1.0" encoding="UTF-8"?>
+                <Response>
+                    <Say>All of our lines are busy right now. Please try again shortly.</Say>
+                </Response>
+                """
+                return Response(content=busy_twiml.strip(), media_type="application/xml")
+            session.caller_lookup = lookup
+            session.timeline.mark("greeting_resolved", greeting_resolved_at)
+            logger.info("📦 Session created for CallSid: %s", call_sid)
+
+            # Create the Ultravox call while Twilio is still setting up the media stream;
+            # media_stream awaits this task instead of starting the round-trip itself
+            session.uv_call_task = asyncio.create_task(create_ultravox_call(
+                system_prompt=SYSTEM_MESSAGE,
+                first_message=first_message,
+                agent_id=caller_number,
+                voice="Tanya-English"
+            ))
+            session.uv_call_task.add_done_callback(functools.partial(_mark_call_created, session))
+            session.uv_call_expiry = asyncio.get_running_loop().call_later(
+                ULTRAVOX_PRECREATE_TIMEOUT, expire_precreated_call, call_sid
+            )
+            logger.info("🎤 Ultravox call creation started in background")
 
         stream_url = f"{PUBLIC_URL.replace('https', 'wss')}/media-stream"
-        print("🔗 WebSocket stream URL:", stream_url)
+        logger.info("🔗 WebSocket stream URL: %s", stream_url)
 
         from xml.sax.saxutils import escape
         escaped_first_message = escape(str(first_message))
@@ -141,12 +231,13 @@ async def incoming_call(request: Request):
             </Connect>
         </Response>
         """
-        print("✅ Returning TwiML response.")
+        if session:
+            session.timeline.mark("twiml_returned")
+        logger.info("✅ Returning TwiML response.")
         return Response(content=twiml.strip(), media_type="application/xml")
 
     except Exception as e:
-        print("❌ Fatal error in /incoming-call route:", e)
-        traceback.print_exc()
+        logger.exception("❌ Fatal error in /incoming-call route: %s", e)
 
         error_twiml = f"""
         <?xml version="1.0" encoding="UTF-8"?>
@@ -160,19 +251,19 @@ async def incoming_call(request: Request):
 
 @router.post("/call-status")
 async def call_status(request: Request):
-    print("\n📞 POST /call-status triggered")
+    logger.info("📞 POST /call-status triggered")
 
     try:
         data = await request.form()
-        print('=== 📱 Twilio Status Update ===')
-        print('📍 Call Status:', data.get('CallStatus'))
-        print('⏱️ Call Duration:', data.get('CallDuration'))
-        print('🕒 Timestamp:', data.get('Timestamp'))
-        print('📌 Call SID:', data.get('CallSid'))
-        print('====== END ======\n')
+        logger.info("=== 📱 Twilio Status Update ===")
+        logger.info("📍 Call Status: %s", data.get('CallStatus'))
+        logger.info("⏱️ Call Duration: %s", data.get('CallDuration'))
+        logger.info("🕒 Timestamp: %s", data.get('Timestamp'))
+        logger.info("📌 Call SID: %s", data.get('CallSid'))
+        logger.info("====== END ======")
 
     except Exception as e:
-        print(f"❌ Exception in /call-status handler: {e}")
+        logger.error("❌ Exception in /call-status handler: %s", e)
         return {"error": str(e)}, 400
 
     return {"success": True}
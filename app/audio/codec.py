@@ -0,0 +1,125 @@
+"""
+G.711 µ-law <-> signed 16-bit PCM transcoding for the media stream hot path.
+
+Replaces `audioop.ulaw2lin` / `audioop.lin2ulaw` (removed in Python 3.13) with
+precomputed lookup tables. Decoding splits the 256-entry table into low/high
+byte tables and applies both with `bytes.translate`; encoding indexes the
+65536-entry table with one vectorised NumPy pass per buffer. Output is
+bit-exact with audioop for width=2.
+"""
+import numpy as np
+
+# G.711 constants (same values as CPython's audioop.c)
+_BIAS = 0x84
+_CLIP = 8159
+_SEG_UEND = np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF], dtype=np.int32)
+
+
+def _build_decode_table() -> np.ndarray:
+    """256-entry table: µ-law byte -> little-endian int16 sample."""
+    uval = ~np.arange(256, dtype=np.int32) & 0xFF
+    t = ((uval & 0x0F) << 3) + _BIAS
+    t <<= (uval & 0x70) >> 4
+    pcm = np.where(uval & 0x80, _BIAS - t, t - _BIAS)
+    return pcm.astype("<i2")
+
+
+def _build_encode_table() -> np.ndarray:
+    """65536-entry table indexed by the raw (unsigned) 16-bit sample -> µ-law byte."""
+    samples = np.arange(65536, dtype=np.uint16).view(np.int16).astype(np.int32)
+    pcm14 = samples >> 2
+    mask = np.where(pcm14 < 0, 0x7F, 0xFF)
+    magnitude = np.minimum(np.abs(pcm14), _CLIP) + (_BIAS >> 2)
+    seg = np.searchsorted(_SEG_UEND, magnitude, side="left")
+    uval = (seg << 4) | ((magnitude >> (np.minimum(seg, 7) + 1)) & 0x0F)
+    uval = np.where(seg >= 8, 0x7F, uval)
+    return (uval ^ mask).astype(np.uint8)
+
+
+ULAW_DECODE_TABLE = _build_decode_table()
+ULAW_ENCODE_TABLE = _build_encode_table()
+
+# Low / high bytes of every decoded sample, as bytes.translate tables
+_DECODE_LO = ULAW_DECODE_TABLE.tobytes()[0::2]
+_DECODE_HI = ULAW_DECODE_TABLE.tobytes()[1::2]
+
+# Twilio media streams are 8 kHz mono, 20 ms per frame
+SAMPLE_RATE = 8000
+FRAME_MS = 20
+SAMPLES_PER_FRAME = SAMPLE_RATE * FRAME_MS // 1000
+
+
+def ulaw_to_pcm16(data) -> bytes:
+    """Decode µ-law bytes to s16le PCM. Allocating equivalent of audioop.ulaw2lin(data, 2)."""
+    if not isinstance(data, bytes):
+        data = bytes(data)
+    out = bytearray(len(data) * 2)
+    out[0::2] = data.translate(_DECODE_LO)
+    out[1::2] = data.translate(_DECODE_HI)
+    return bytes(out)
+
+
+def pcm16_to_ulaw(data) -> bytes:
+    """Encode s16le PCM to µ-law bytes. Allocating equivalent of audioop.lin2ulaw(data, 2)."""
+    if len(data) % 2:
+        raise ValueError("not a whole number of frames")
+    return ULAW_ENCODE_TABLE[np.frombuffer(data, dtype="<u2")].tobytes()
+
+
+class MuLawTranscoder:
+    """
+    Per-direction transcoder that writes into reusable buffers.
+
+    The memoryview returned by `decode` / `encode` aliases an internal buffer
+    and is only valid until the next call on the same instance; copy it
+    (`bytes(view)`) if it has to outlive that.
+    """
+
+    __slots__ = ("_pcm_buf", "_pcm_view", "_ulaw_buf", "_ulaw_arr", "_ulaw_view")
+
+    def __init__(self, frame_samples: int = SAMPLES_PER_FRAME):
+        self._alloc_pcm(frame_samples)
+        self._alloc_ulaw(frame_samples)
+
+    # A fresh buffer rather than a resize: views handed out earlier may still be alive.
+    def _alloc_pcm(self, samples: int):
+        self._pcm_buf = bytearray(samples * 2)
+        self._pcm_view = memoryview(self._pcm_buf)
+
+    def _alloc_ulaw(self, samples: int):
+        self._ulaw_buf = bytearray(samples)
+        self._ulaw_arr = np.frombuffer(self._ulaw_buf, dtype=np.uint8)
+        self._ulaw_view = memoryview(self._ulaw_buf)
+
+    def decode(self, ulaw: bytes) -> memoryview:
+        """µ-law -> s16le PCM into the reusable PCM buffer."""
+        n = len(ulaw)
+        if n * 2 != len(self._pcm_buf):
+            if n * 2 > len(self._pcm_buf):
+                self._alloc_pcm(n)
+            else:
+                # Shorter than the buffer: strided slice assignment needs an exact fit
+                lo = self._pcm_view[0:n * 2]
+                lo[0::2] = ulaw.translate(_DECODE_LO)
+                lo[1::2] = ulaw.translate(_DECODE_HI)
+                return lo
+        buf = self._pcm_buf
+        buf[0::2] = ulaw.translate(_DECODE_LO)
+        buf[1::2] = ulaw.translate(_DECODE_HI)
+        return self._pcm_view
+
+    def encode(self, pcm) -> memoryview:
+        """s16le PCM -> µ-law into the reusable µ-law buffer."""
+        if len(pcm) % 2:
+            raise ValueError("not a whole number of frames")
+        src = np.frombuffer(pcm, dtype="<u2")
+        n = src.size
+        if n == self._ulaw_arr.size:
+            ULAW_ENCODE_TABLE.take(src, out=self._ulaw_arr)
+            return self._ulaw_view
+        if n > self._ulaw_arr.size:
+            self._alloc_ulaw(n)
+            ULAW_ENCODE_TABLE.take(src, out=self._ulaw_arr)
+            return self._ulaw_view
+        ULAW_ENCODE_TABLE.take(src, out=self._ulaw_arr[:n])
+        return self._ulaw_view[:n]
@@ -0,0 +1,219 @@
+"""
+Paced outbound playout of agent audio towards Twilio.
+
+Ultravox delivers PCM in chunks sized by its client buffer, not by Twilio's
+20 ms framing. `OutboundPlayout` encodes those chunks into a per-call µ-law
+ring buffer and re-emits them as exact 20 ms frames at real-time pace, only
+ever running `lead_ms` ahead of the caller's ear. Twilio `mark` events sent
+every `mark_interval_ms` report back what has actually been played.
+
+On barge-in, `interrupt()` drops the queued audio and issues Twilio's `clear`;
+the interruption counts as effective once Twilio echoes the mark placed just
+before the clear, i.e. once its own buffer has actually been emptied.
+"""
+import asyncio
+
+from app.audio.codec import FRAME_MS, SAMPLE_RATE, SAMPLES_PER_FRAME
+
+FRAME_BYTES = SAMPLES_PER_FRAME  # µ-law is one byte per sample
+BYTES_PER_MS = SAMPLE_RATE // 1000
+ULAW_SILENCE = 0xFF
+
+
+class RingBuffer:
+    """Fixed-capacity byte FIFO; writing past capacity overwrites the oldest bytes."""
+
+    __slots__ = ("_buf", "_view", "_cap", "_read", "_size")
+
+    def __init__(self, capacity: int):
+        self._cap = max(1, capacity)
+        self._buf = bytearray(self._cap)
+        self._view = memoryview(self._buf)
+        self._read = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def write(self, data) -> int:
+        """Append `data`; returns the number of old bytes overwritten."""
+        data = memoryview(data)
+        n = len(data)
+        cap = self._cap
+        dropped = 0
+        if n >= cap:
+            dropped = self._size + n - cap
+            data = data[n - cap:]
+            n = cap
+            self._read = 0
+            self._size = 0
+        overflow = self._size + n - cap
+        if overflow > 0:
+            self._read = (self._read + overflow) % cap
+            self._size -= overflow
+            dropped += overflow
+        write = (self._read + self._size) % cap
+        first = min(n, cap - write)
+        self._view[write:write + first] = data[:first]
+        if first < n:
+            self._view[0:n - first] = data[first:]
+        self._size += n
+        return dropped
+
+    def read_into(self, out, n: int):
+        """Move the oldest `n` bytes (n <= len(self)) into the start of `out`."""
+        read = self._read
+        first = min(n, self._cap - read)
+        out[0:first] = self._view[read:read + first]
+        if first < n:
+            out[first:n] = self._view[0:n - first]
+        self._read = (read + n) % self._cap
+        self._size -= n
+
+    def clear(self) -> int:
+        cleared = self._size
+        self._read = 0
+        self._size = 0
+        return cleared
+
+
+class OutboundPlayout:
+    """Re-frames and paces one call's agent audio. `run()` is the pacing task."""
+
+    def __init__(self, codec, capacity_ms: int, lead_ms: int, mark_interval_ms: int):
+        self._codec = codec
+        self._ring = RingBuffer(capacity_ms * BYTES_PER_MS)
+        self._frame = bytearray(FRAME_BYTES)
+        self._data = asyncio.Event()
+        self._closed = False
+        self._lead = lead_ms / 1000
+        self._mark_every = max(1, mark_interval_ms // FRAME_MS)
+        self._last_mark = 0
+        self._play_end = 0.0
+        self.frames_sent = 0
+        self.frames_played = 0
+        self.dropped_bytes = 0
+        self.padded_frames = 0
+        self._interrupt_at = None
+        self._interrupt_mark = 0
+        self.interrupt_latencies_ms = []
+
+    def write_pcm(self, pcm):
+        """Queue a chunk of s16le agent audio of any size."""
+        self.dropped_bytes += self._ring.write(self._codec.encode(pcm))
+        self._data.set()
+
+    def on_mark(self, name):
+        """Twilio echoed a mark: everything sent before it has been played."""
+        try:
+            played = int(name)
+        except (TypeError, ValueError):
+            return
+        if played > self.frames_played:
+            self.frames_played = played
+        if self._interrupt_at is not None and played >= self._interrupt_mark:
+            self._interrupted()
+
+    def interrupt(self, send_mark, send_clear) -> int:
+        """
+        Barge-in: flush the ring buffer and tell Twilio to drop what it has
+        buffered. Returns the milliseconds of agent audio flushed locally.
+        """
+        flushed = self._ring.clear()
+        self._interrupt_at = asyncio.get_running_loop().time()
+        # Twilio echoes outstanding marks when it clears, so this mark confirms the clear
+        self._mark(send_mark)
+        self._interrupt_mark = self._last_mark
+        send_clear()
+        self._play_end = 0.0
+        if self.frames_played >= self._interrupt_mark:
+            # Nothing was left playing at Twilio's end
+            self._interrupted()
+        return flushed // BYTES_PER_MS
+
+    def _interrupted(self):
+        elapsed = asyncio.get_running_loop().time() - self._interrupt_at
+        self.interrupt_latencies_ms.append(round(elapsed * 1000, 1))
+        self._interrupt_at = None
+
+    @property
+    def queued_ms(self) -> int:
+        """Agent audio still waiting in the ring buffer."""
+        return len(self._ring) // BYTES_PER_MS
+
+    @property
+    def unplayed_ms(self) -> int:
+        """Audio sent to Twilio but not yet confirmed played (mark granularity)."""
+        return (self.frames_sent - self.frames_played) * FRAME_MS
+
+    def close(self):
+        self._closed = True
+        self._data.set()
+
+    def _emit(self, send_frame, now: float, frame_s: float):
+        send_frame(self._frame)
+        self._play_end = max(self._play_end, now) + frame_s
+        self.frames_sent += 1
+
+    def _mark(self, send_mark):
+        if self._last_mark != self.frames_sent:
+            self._last_mark = self.frames_sent
+            send_mark(str(self.frames_sent))
+
+    async def run(self, send_frame, send_mark):
+        """
+        Pace frames out until closed. `send_frame(ulaw)` must consume the
+        buffer before returning; `send_mark(name)` queues a Twilio mark.
+
+        `_play_end` estimates when Twilio will finish playing everything sent
+        so far; a frame is only released while that stays within `lead_ms`.
+        """
+        loop = asyncio.get_running_loop()
+        frame_s = FRAME_MS / 1000
+        idle_s = self._mark_every * frame_s
+        while not self._closed:
+            buffered = len(self._ring)
+            now = loop.time()
+            ahead = self._play_end - now
+
+            if buffered >= FRAME_BYTES:
+                if ahead > self._lead:
+                    await asyncio.sleep(ahead - self._lead)
+                    continue
+                self._ring.read_into(self._frame, FRAME_BYTES)
+                self._emit(send_frame, now, frame_s)
+                if self.frames_sent - self._last_mark >= self._mark_every:
+                    self._mark(send_mark)
+                continue
+
+            if buffered:
+                # Partial frame: wait for the rest until Twilio is about to run dry
+                timeout = max(frame_s, ahead)
+            elif self._last_mark != self.frames_sent:
+                # Agent stopped talking: mark the tail once the gap is long enough
+                timeout = idle_s
+            else:
+                timeout = None
+            self._data.clear()
+            try:
+                await asyncio.wait_for(self._data.wait(), timeout)
+            except asyncio.TimeoutError:
+                if buffered:
+                    self._ring.read_into(self._frame, buffered)
+                    self._frame[buffered:] = bytes([ULAW_SILENCE]) * (FRAME_BYTES - buffered)
+                    self.padded_frames += 1
+                    self._emit(send_frame, loop.time(), frame_s)
+                else:
+                    self._mark(send_mark)
+
+    def stats(self) -> dict:
+        return {
+            "queued_ms": self.queued_ms,
+            "unplayed_ms": self.unplayed_ms,
+            "frames_sent": self.frames_sent,
+            "frames_played": self.frames_played,
+            "dropped_ms": self.dropped_bytes // BYTES_PER_MS,
+            "padded_frames": self.padded_frames,
+            "interruptions": len(self.interrupt_latencies_ms),
+            "interrupt_latency_ms": self.interrupt_latencies_ms,
+        }
@@ -12,14 +12,18 @@ print("✅ .env loaded.\n")
 TWILIO_ACCOUNT_SID = os.environ.get('TWILIO_ACCOUNT_SID')
 TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN')
 TWILIO_PHONE_NUMBER = os.environ.get('TWILIO_PHONE_NUMBER')
+# REST API root; point it at a local fake to exercise call control without Twilio
+TWILIO_API_BASE_URL = os.environ.get('TWILIO_API_BASE_URL', 'https://api.twilio.com')
 
 print("🔐 Twilio Config:")
 print("  - TWILIO_ACCOUNT_SID:", "✅ Loaded" if TWILIO_ACCOUNT_SID else "❌ MISSING")
 print("  - TWILIO_AUTH_TOKEN:", "✅ Loaded" if TWILIO_AUTH_TOKEN else "❌ MISSING")
 print("  - TWILIO_PHONE_NUMBER:", TWILIO_PHONE_NUMBER or "❌ MISSING")
+print("  - TWILIO_API_BASE_URL:", TWILIO_API_BASE_URL)
 
 # Ultravox credentials
 ULTRAVOX_API_KEY = os.environ.get('ULTRAVOX_API_KEY')
+ULTRAVOX_API_URL = os.environ.get('ULTRAVOX_API_URL', 'https://api.ultravox.ai')
 ULTRAVOX_MODEL = "fixie-ai/ultravox-70B"
 ULTRAVOX_VOICE = "Matthew-English"   # or "Mark"
 ULTRAVOX_SAMPLE_RATE = 8000        
@@ -27,11 +31,49 @@ ULTRAVOX_BUFFER_SIZE = 60
 
 print("\n🔊 Ultravox Config:")
 print("  - ULTRAVOX_API_KEY:", "✅ Loaded" if ULTRAVOX_API_KEY else "❌ MISSING")
+print("  - ULTRAVOX_API_URL:", ULTRAVOX_API_URL)
 print("  - ULTRAVOX_MODEL:", ULTRAVOX_MODEL)
 print("  - ULTRAVOX_VOICE:", ULTRAVOX_VOICE)
 print("  - ULTRAVOX_SAMPLE_RATE:", ULTRAVOX_SAMPLE_RATE)
 print("  - ULTRAVOX_BUFFER_SIZE:", ULTRAVOX_BUFFER_SIZE)
 
+# Seconds a call pre-created at /incoming-call waits for its media stream before being discarded
+ULTRAVOX_PRECREATE_TIMEOUT = float(os.environ.get('ULTRAVOX_PRECREATE_TIMEOUT', '30'))
+print("  - ULTRAVOX_PRECREATE_TIMEOUT:", ULTRAVOX_PRECREATE_TIMEOUT)
+
+# Media stream queues (max audio frames buffered per direction before dropping the oldest)
+TWILIO_QUEUE_DEPTH = int(os.environ.get('TWILIO_QUEUE_DEPTH', '50'))
+ULTRAVOX_QUEUE_DEPTH = int(os.environ.get('ULTRAVOX_QUEUE_DEPTH', '50'))
+
+print("\n📦 Media Queue Config:")
+print("  - TWILIO_QUEUE_DEPTH:", TWILIO_QUEUE_DEPTH)
+print("  - ULTRAVOX_QUEUE_DEPTH:", ULTRAVOX_QUEUE_DEPTH)
+
+# Outbound playout: agent audio is re-framed to 20 ms and paced to Twilio in real time
+TWILIO_PLAYOUT_BUFFER_MS = int(os.environ.get('TWILIO_PLAYOUT_BUFFER_MS', '3000'))
+TWILIO_PLAYOUT_LEAD_MS = int(os.environ.get('TWILIO_PLAYOUT_LEAD_MS', '60'))
+TWILIO_MARK_INTERVAL_MS = int(os.environ.get('TWILIO_MARK_INTERVAL_MS', '200'))
+
+print("\n⏱️ Playout Config:")
+print("  - TWILIO_PLAYOUT_BUFFER_MS:", TWILIO_PLAYOUT_BUFFER_MS)
+print("  - TWILIO_PLAYOUT_LEAD_MS:", TWILIO_PLAYOUT_LEAD_MS)
+print("  - TWILIO_MARK_INTERVAL_MS:", TWILIO_MARK_INTERVAL_MS)
+
+# Session store bounds: sessions with no media stream after SESSION_CREATE_TTL seconds,
+# or no activity for SESSION_IDLE_TTL seconds, are swept every SESSION_SWEEP_INTERVAL;
+# beyond SESSION_MAX live sessions the oldest one still without a stream is evicted
+# (new calls are refused when every session is mid-call)
+SESSION_CREATE_TTL = float(os.environ.get('SESSION_CREATE_TTL', '60'))
+SESSION_IDLE_TTL = float(os.environ.get('SESSION_IDLE_TTL', '600'))
+SESSION_MAX = int(os.environ.get('SESSION_MAX', '1000'))
+SESSION_SWEEP_INTERVAL = float(os.environ.get('SESSION_SWEEP_INTERVAL', '15'))
+
+print("\n🧹 Session Store Config:")
+print("  - SESSION_CREATE_TTL:", SESSION_CREATE_TTL)
+print("  - SESSION_IDLE_TTL:", SESSION_IDLE_TTL)
+print("  - SESSION_MAX:", SESSION_MAX)
+print("  - SESSION_SWEEP_INTERVAL:", SESSION_SWEEP_INTERVAL)
+
 # Webhooks
 N8N_WEBHOOK_URL = os.environ.get('N8N_WEBHOOK_URL')
 PUBLIC_URL = os.environ.get('PUBLIC_URL')
@@ -40,6 +82,88 @@ print("\n🔗 Webhook URLs:")
 print("  - N8N_WEBHOOK_URL:", N8N_WEBHOOK_URL or "❌ MISSING")
 print("  - PUBLIC_URL:", PUBLIC_URL or "❌ MISSING")
 
+# Transcript outbox: transcripts are written to this SQLite file at call teardown and
+# delivered to N8N_WEBHOOK_URL in the background (retried with backoff, replayed on restart)
+OUTBOX_PATH = os.environ.get('OUTBOX_PATH', 'outbox.sqlite3')
+OUTBOX_CONCURRENCY = int(os.environ.get('OUTBOX_CONCURRENCY', '4'))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '8'))
+OUTBOX_BACKOFF_BASE = float(os.environ.get('OUTBOX_BACKOFF_BASE', '1'))
+OUTBOX_BACKOFF_MAX = float(os.environ.get('OUTBOX_BACKOFF_MAX', '300'))
+
+print("\n📬 Outbox Config:")
+print("  - OUTBOX_PATH:", OUTBOX_PATH)
+print("  - OUTBOX_CONCURRENCY:", OUTBOX_CONCURRENCY)
+print("  - OUTBOX_MAX_ATTEMPTS:", OUTBOX_MAX_ATTEMPTS)
+print("  - OUTBOX_BACKOFF_BASE:", OUTBOX_BACKOFF_BASE)
+print("  - OUTBOX_BACKOFF_MAX:", OUTBOX_BACKOFF_MAX)
+
+# Optional batching of outbox deliveries: payloads for the same route are POSTed together
+# as one JSON array once N8N_BATCH_SIZE are queued or N8N_BATCH_WINDOW seconds have passed.
+# Requests whose reply is used during the call (greeting lookup, bookings) are never batched.
+N8N_BATCH_ENABLED = os.environ.get('N8N_BATCH_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+N8N_BATCH_WINDOW = float(os.environ.get('N8N_BATCH_WINDOW', '2'))
+N8N_BATCH_SIZE = int(os.environ.get('N8N_BATCH_SIZE', '20'))
+
+print("\n📦 N8N Batching Config:")
+print("  - N8N_BATCH_ENABLED:", N8N_BATCH_ENABLED)
+print("  - N8N_BATCH_WINDOW:", N8N_BATCH_WINDOW)
+print("  - N8N_BATCH_SIZE:", N8N_BATCH_SIZE)
+
+# n8n resilience: per-route circuit breaker (opens after N8N_BREAKER_FAILURES consecutive
+# failures, retried after N8N_BREAKER_RESET seconds) and hedged requests for idempotent
+# routes (a second request after the route's p95 latency, N8N_HEDGE_DELAY until measured)
+N8N_BREAKER_FAILURES = int(os.environ.get('N8N_BREAKER_FAILURES', '5'))
+N8N_BREAKER_RESET = float(os.environ.get('N8N_BREAKER_RESET', '30'))
+N8N_HEDGE_ROUTES = {r.strip() for r in os.environ.get('N8N_HEDGE_ROUTES', '1').split(',') if r.strip()}
+N8N_HEDGE_DELAY = float(os.environ.get('N8N_HEDGE_DELAY', '1'))
+
+print("\n🔌 N8N Resilience Config:")
+print("  - N8N_BREAKER_FAILURES:", N8N_BREAKER_FAILURES)
+print("  - N8N_BREAKER_RESET:", N8N_BREAKER_RESET)
+print("  - N8N_HEDGE_ROUTES:", sorted(N8N_HEDGE_ROUTES) or "disabled")
+print("  - N8N_HEDGE_DELAY:", N8N_HEDGE_DELAY)
+
+# Shared HTTP client pools (per upstream host)
+HTTP_MAX_CONNECTIONS = int(os.environ.get('HTTP_MAX_CONNECTIONS', '100'))
+HTTP_MAX_KEEPALIVE = int(os.environ.get('HTTP_MAX_KEEPALIVE', '20'))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get('HTTP_KEEPALIVE_EXPIRY', '60'))
+
+print("\n🌐 HTTP Pool Config:")
+print("  - HTTP_MAX_CONNECTIONS:", HTTP_MAX_CONNECTIONS)
+print("  - HTTP_MAX_KEEPALIVE:", HTTP_MAX_KEEPALIVE)
+print("  - HTTP_KEEPALIVE_EXPIRY:", HTTP_KEEPALIVE_EXPIRY)
+
+# Logging: level for the app loggers, "text" or "json" lines, and the fraction of calls
+# whose full Ultravox/n8n payloads are dumped at INFO (they always are at DEBUG)
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()
+LOG_PAYLOAD_SAMPLE_RATE = float(os.environ.get('LOG_PAYLOAD_SAMPLE_RATE', '0'))
+
+print("\n📝 Logging Config:")
+print("  - LOG_LEVEL:", LOG_LEVEL)
+print("  - LOG_FORMAT:", LOG_FORMAT)
+print("  - LOG_PAYLOAD_SAMPLE_RATE:", LOG_PAYLOAD_SAMPLE_RATE)
+
+# Metrics: how often the event-loop lag probe wakes up (seconds)
+LOOP_LAG_INTERVAL = float(os.environ.get('LOOP_LAG_INTERVAL', '0.5'))
+# Event-loop watchdog: log the loop thread's stack when it is blocked longer than
+# LOOP_BLOCK_THRESHOLD_MS (0 disables); with LOOP_STRICT_MS set (load tests), exit
+# the process once the loop has been blocked longer than that
+LOOP_BLOCK_THRESHOLD_MS = float(os.environ.get('LOOP_BLOCK_THRESHOLD_MS', '100'))
+LOOP_STRICT_MS = float(os.environ.get('LOOP_STRICT_MS', '0'))
+
+print("\n📈 Metrics Config:")
+print("  - LOOP_LAG_INTERVAL:", LOOP_LAG_INTERVAL)
+print("  - LOOP_BLOCK_THRESHOLD_MS:", LOOP_BLOCK_THRESHOLD_MS)
+print("  - LOOP_STRICT_MS:", LOOP_STRICT_MS)
+
+# Media capture: when set, every media stream's Twilio and Ultravox WebSocket traffic is
+# written to <MEDIA_CAPTURE_DIR>/<CallSid>.gcap for replay with bench.replay
+MEDIA_CAPTURE_DIR = os.environ.get('MEDIA_CAPTURE_DIR', '')
+
+print("\n📼 Capture Config:")
+print("  - MEDIA_CAPTURE_DIR:", MEDIA_CAPTURE_DIR or "off")
+
 # Server settings
 PORT = int(os.environ.get('PORT', '8000'))
 print("\n⚙️ Server Port:", PORT)
@@ -48,6 +172,21 @@ print("\n⚙️ Server Port:", PORT)
 DEFAULT_FIRST_MESSAGE = "Hey, this is Sarah from Admiral. How can I assist you today?"
 print("🗨️ Default First Message:", DEFAULT_FIRST_MESSAGE)
 
+# Greeting lookup: n8n gets this long before DEFAULT_FIRST_MESSAGE is used,
+# and answers are cached per caller number. Within GREETING_CACHE_TTL a call
+# skips n8n at /incoming-call; up to GREETING_CACHE_STALE_TTL the cached
+# greeting is served while n8n refreshes it
+GREETING_TIMEOUT = float(os.environ.get('GREETING_TIMEOUT', '1.5'))
+GREETING_CACHE_SIZE = int(os.environ.get('GREETING_CACHE_SIZE', '1024'))
+GREETING_CACHE_TTL = float(os.environ.get('GREETING_CACHE_TTL', '300'))
+GREETING_CACHE_STALE_TTL = float(os.environ.get('GREETING_CACHE_STALE_TTL', '3600'))
+
+print("⏳ Greeting Config:")
+print("  - GREETING_TIMEOUT:", GREETING_TIMEOUT)
+print("  - GREETING_CACHE_SIZE:", GREETING_CACHE_SIZE)
+print("  - GREETING_CACHE_TTL:", GREETING_CACHE_TTL)
+print("  - GREETING_CACHE_STALE_TTL:", GREETING_CACHE_STALE_TTL)
+
 # Calendar mappings
 CALENDARS_LIST = {
     "LOCATION1": "CALENDAR_EMAIL1",
@@ -59,6 +198,14 @@ print("\n📅 Calendar Configs:")
 for loc, cal in CALENDARS_LIST.items():
     print(f"  - {loc}: {cal}")
 
+# Tools: default timeout (seconds) for tools that don't declare one, and how long
+# results of tools registered as cacheable are reused
+TOOL_TIMEOUT = float(os.environ.get('TOOL_TIMEOUT', '10'))
+TOOL_CACHE_TTL = float(os.environ.get('TOOL_CACHE_TTL', '300'))
+print("\n🛠️ Tool Config:")
+print("  - TOOL_TIMEOUT:", TOOL_TIMEOUT)
+print("  - TOOL_CACHE_TTL:", TOOL_CACHE_TTL)
+
 # Logging event types
 LOG_EVENT_TYPES = [
     'response.content.done',
@@ -0,0 +1,158 @@
+"""
+Application logging.
+
+Records are handed to a background thread through a QueueHandler, so the
+event loop never blocks on stdout. Log calls use %-style arguments and pay
+nothing for the message text unless a record is emitted; an emitted message
+is rendered when it is queued, since its arguments may change afterwards,
+while the JSON dump of a logged payload is left to the writer thread. Every record carries the CallSid and
+streamSid of the call it was logged from, taken from context variables that
+the request and media-stream handlers set; the same handlers decide, once
+per call, whether its payloads are sampled. In JSON mode, a dict passed as
+`extra={"data": ...}` is emitted as a structured field.
+"""
+import copy
+import json
+import queue
+import zlib
+import logging
+import logging.handlers
+from contextvars import ContextVar
+from app.core.config import LOG_LEVEL, LOG_FORMAT, LOG_PAYLOAD_SAMPLE_RATE
+
+call_sid_var = ContextVar("call_sid", default="-")
+stream_sid_var = ContextVar("stream_sid", default="-")
+payload_sampled_var = ContextVar("payload_sampled", default=False)
+
+_listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
+
+
+def set_call_context(call_sid: str = None, stream_sid: str = None):
+    """Tag records logged from the current task (and tasks it starts) with this call."""
+    if call_sid:
+        call_sid_var.set(call_sid)
+        payload_sampled_var.set(_payload_sampled(call_sid))
+    if stream_sid:
+        stream_sid_var.set(stream_sid)
+
+
+def _payload_sampled(call_sid: str) -> bool:
+    # Hashed rather than drawn, so the webhook and the media stream agree about a call
+    return zlib.crc32(call_sid.encode()) < LOG_PAYLOAD_SAMPLE_RATE * 2 ** 32
+
+
+class _CallContextFilter(logging.Filter):
+    def filter(self, record):
+        record.call_sid = call_sid_var.get()
+        record.stream_sid = stream_sid_var.get()
+        return True
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that snapshots a record on the loop and leaves payload dumps to the listener thread."""
+
+    def prepare(self, record):
+        args = record.args
+        if isinstance(args, tuple) and any(isinstance(arg, _Dump) for arg in args):
+            record.args = tuple(arg.snapshot() if isinstance(arg, _Dump) else arg for arg in args)
+        else:
+            record.msg = record.getMessage()
+            record.args = None
+        data = getattr(record, "data", None)
+        if data is not None:
+            record.data = _copy(data)
+        return record
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "call_sid": getattr(record, "call_sid", "-"),
+            "stream_sid": getattr(record, "stream_sid", "-"),
+            "msg": record.getMessage(),
+        }
+        data = getattr(record, "data", None)
+        if data is not None:
+            entry["data"] = data
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _copy(payload):
+    try:
+        return copy.deepcopy(payload)
+    except Exception:
+        return payload
+
+
+class _Dump:
+    """Renders a payload as indented JSON only when the record is formatted."""
+
+    __slots__ = ("payload",)
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def snapshot(self):
+        """A copy the event loop can no longer change, for the writer thread to dump."""
+        return _Dump(_copy(self.payload))
+
+    def __str__(self):
+        try:
+            return json.dumps(self.payload, indent=2, default=str)
+        except (TypeError, ValueError):
+            return repr(self.payload)
+
+
+def log_payload(logger: logging.Logger, label: str, payload):
+    """
+    Dump a full payload at DEBUG, or at INFO for a LOG_PAYLOAD_SAMPLE_RATE
+    fraction of calls (all of a sampled call's payloads). Skipped entirely otherwise.
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s:\n%s", label, _Dump(payload))
+    elif payload_sampled_var.get():
+        logger.info("%s (sampled):\n%s", label, _Dump(payload))
+
+
+def setup_logging():
+    """Route the `app` loggers through a queue to a stdout writer thread."""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler()
+    if LOG_FORMAT == "json":
+        stream.setFormatter(_JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s [%(call_sid)s] %(message)s"
+        ))
+
+    records = queue.SimpleQueue()
+    handler = _DeferredQueueHandler(records)
+    handler.addFilter(_CallContextFilter())
+
+    app_logger = logging.getLogger("app")
+    app_logger.setLevel(LOG_LEVEL)
+    app_logger.addHandler(handler)
+    app_logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(records, stream, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,184 @@
+"""
+In-process metrics primitives and their Prometheus text exposition.
+
+Updates are plain attribute arithmetic on the event loop thread, so they are
+cheap enough for per-frame and per-request hot paths and need no locks.
+Metrics are declared once as families (`counter()`, `gauge()`, `histogram()`);
+`family.labels(...)` returns the child to update, so hot paths bind their
+children up front instead of resolving labels on every update.
+"""
+from bisect import bisect_left
+
+# Seconds; covers sub-ms codec work up to slow webhook retries
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Counter:
+    """Monotonic counter."""
+
+    __slots__ = ("name", "value")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+
+class Gauge:
+    """Value that can go up and down."""
+
+    __slots__ = ("name", "value")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+
+class Histogram:
+    """Fixed-bucket histogram (cumulative on export, per-bucket internally)."""
+
+    __slots__ = ("name", "buckets", "counts", "sum", "count")
+
+    def __init__(self, name: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile (0 < q <= 1)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+        }
+
+
+class Family:
+    """A named metric and its children, one per combination of label values."""
+
+    __slots__ = ("kind", "name", "help", "labelnames", "_make", "_children")
+
+    def __init__(self, kind: str, name: str, help: str, labelnames, make):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._make = make
+        self._children = {}
+
+    def labels(self, *values):
+        """The child for these label values (created on first use). Bind it once, outside hot loops."""
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            child = self._children[values] = self._make(self.name)
+        return child
+
+    def clear(self):
+        self._children.clear()
+
+    def _label_str(self, values, extra=()):
+        pairs = [*zip(self.labelnames, values), *extra]
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+    def expose(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            if self.kind != "histogram":
+                lines.append(f"{self.name}{self._label_str(values)} {_number(child.value)}")
+                continue
+            cumulative = 0
+            for bound, n in zip(child.buckets, child.counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{self._label_str(values, (('le', _number(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{self._label_str(values, (('le', '+Inf'),))} {child.count}")
+            lines.append(f"{self.name}_sum{self._label_str(values)} {_number(child.sum)}")
+            lines.append(f"{self.name}_count{self._label_str(values)} {child.count}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+_families = {}
+_collectors = []
+
+
+def _family(kind: str, name: str, help: str, labelnames, make) -> Family:
+    family = _families.get(name)
+    if family is None:
+        family = _families[name] = Family(kind, name, help, labelnames, make)
+    elif family.kind != kind or family.labelnames != tuple(labelnames):
+        raise ValueError(f"Metric {name} already registered as a different {family.kind}")
+    return family
+
+
+def counter(name: str, help: str, labelnames=()) -> Family:
+    return _family("counter", name, help, labelnames, Counter)
+
+
+def gauge(name: str, help: str, labelnames=()) -> Family:
+    return _family("gauge", name, help, labelnames, Gauge)
+
+
+def histogram(name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Family:
+    buckets = tuple(buckets)
+    return _family("histogram", name, help, labelnames, lambda n: Histogram(n, buckets))
+
+
+def on_collect(fn):
+    """Register `fn()` to run before every exposition, to refresh gauges derived from live state."""
+    _collectors.append(fn)
+    return fn
+
+
+def render() -> str:
+    """All registered metrics in the Prometheus text exposition format (0.0.4)."""
+    for fn in _collectors:
+        fn()
+    lines = []
+    for family in list(_families.values()):
+        lines.extend(family.expose())
+    return "\n".join(lines) + "\n"
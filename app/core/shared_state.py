@@ -3,6 +3,228 @@ Shared state for the application.
 This module contains shared state that needs to be accessed by multiple modules.
 Keeping it here helps avoid circular import issues.
 """
+import time
+from collections import OrderedDict
+from app.core.config import SESSION_MAX
+from app.core.metrics import counter, gauge, on_collect
+from app.utils.transcript import Transcript
+from app.utils.transcript_scanner import scan as scan_transcript
+from app.utils.call_timeline import CallTimeline
+
+SESSION_EVICTIONS = counter("sessions_evicted_total", "Sessions evicted by the registry", ("reason",))
+SESSIONS_ACTIVE = gauge("sessions_active", "Live sessions, by whether their media stream has started", ("state",))
+
+
+class Session:
+    """Per-call state, created at /incoming-call and filled in by the media stream."""
+
+    __slots__ = (
+        # Call identity
+        "call_sid", "caller_number", "stream_sid", "first_message",
+        "webhook_received_at", "created_at", "last_activity", "timeline",
+        # Caller-profile lookup (n8n route 1) started at /incoming-call
+        "caller_lookup",
+        # Ultravox call pre-created at /incoming-call
+        "uv_call_task", "uv_call_expiry",
+        # Live media stream
+        "uv_ws", "twilio_ws_active", "ultravox_ws_active", "hanging_up",
+        "queues", "playout",
+        # Conversation and what was extracted from it
+        "transcript", "caller_name", "caller_email", "appointment_time",
+        "calendar_id", "route", "signals",
+        # Delivery to n8n
+        "transcript_sent", "realtime_payload_sent",
+    )
+
+    def __init__(self, call_sid: str, caller_number: str = "Unknown", first_message: str = "",
+                 webhook_received_at: float = None):
+        self.call_sid = call_sid
+        self.caller_number = caller_number
+        self.stream_sid = None
+        self.first_message = first_message
+        self.webhook_received_at = webhook_received_at
+        self.created_at = self.last_activity = time.monotonic()
+        self.timeline = CallTimeline(webhook_received_at)
+        self.caller_lookup = None
+
+        self.uv_call_task = None
+        self.uv_call_expiry = None
+
+        self.uv_ws = None
+        self.twilio_ws_active = False
+        self.ultravox_ws_active = False
+        self.hanging_up = False
+        self.queues = {}
+        self.playout = None
+
+        self.transcript = Transcript()
+        self.caller_name = None
+        self.caller_email = None
+        self.appointment_time = None
+        self.calendar_id = "primary"
+        self.route = None
+        self.signals = set()  # transcript_scanner pattern names seen so far
+
+        self.transcript_sent = False
+        self.realtime_payload_sent = False
+
+    def flush_transcript(self):
+        """
+        Finalize utterances cut off by the end of the call and scan them, as
+        the media stream scans finalized ones, before the transcript is sent.
+        """
+        for segment in self.transcript.flush():
+            hits = scan_transcript(segment.text)
+            self.signals.update(hits)
+            if segment.role == "user":
+                if "name" in hits:
+                    self.caller_name = segment.text
+                if "email" in hits:
+                    self.caller_email = hits["email"]
+
+    def discard(self):
+        """Release background work still attached to a session that is being dropped."""
+        if self.uv_call_expiry is not None:
+            self.uv_call_expiry.cancel()
+            self.uv_call_expiry = None
+        if self.uv_call_task is not None:
+            self.uv_call_task.cancel()
+            self.uv_call_task = None
+
+    def __repr__(self):
+        return f"<Session {self.call_sid} caller={self.caller_number} stream={self.stream_sid}>"
+
+
+class SessionRegistry:
+    """
+    Live sessions keyed by CallSid, with secondary indexes by streamSid and by
+    Ultravox websocket so every lookup is a single dict access.
+
+    Two time-ordered indexes keep expiry cheap: `_pending` holds sessions whose
+    media stream has not started yet, in creation order, and `_lru` holds all
+    sessions in order of last activity. A sweep only looks at the oldest end of
+    each and stops at the first session that is still within its TTL.
+    """
+
+    EVICTION_REASONS = ("no_stream", "idle", "capacity")
+
+    def __init__(self, max_sessions: int = 0):
+        self.max_sessions = max_sessions
+        self._by_call_sid = {}
+        self._by_stream_sid = {}
+        self._by_uv_ws = {}
+        self._pending = OrderedDict()
+        self._lru = OrderedDict()
+        self.evictions = {reason: SESSION_EVICTIONS.labels(reason) for reason in self.EVICTION_REASONS}
+
+    def __contains__(self, call_sid):
+        return call_sid in self._by_call_sid
+
+    def __len__(self):
+        return len(self._by_call_sid)
+
+    def __iter__(self):
+        return iter(list(self._by_call_sid.values()))
+
+    def add(self, session: Session):
+        """
+        Register a new session. At max_sessions the oldest session still waiting
+        for its media stream is evicted; a session with a live stream never is,
+        so when every slot is mid-call the new session is refused (returns None).
+        """
+        if self.max_sessions:
+            while len(self._by_call_sid) >= self.max_sessions:
+                if not self._pending:
+                    return None
+                self._evict(next(iter(self._pending)), "capacity")
+        self._by_call_sid[session.call_sid] = session
+        self._pending[session.call_sid] = session
+        self._lru[session.call_sid] = session
+        self._lru.move_to_end(session.call_sid)
+        return session
+
+    def touch(self, session: Session, now: float = None):
+        """Record activity on a session, moving it to the fresh end of the idle index."""
+        session.last_activity = now if now is not None else time.monotonic()
+        if session.call_sid in self._lru:
+            self._lru.move_to_end(session.call_sid)
+
+    def get(self, call_sid: str):
+        return self._by_call_sid.get(call_sid)
+
+    def by_stream_sid(self, stream_sid: str):
+        return self._by_stream_sid.get(stream_sid)
+
+    def by_uv_ws(self, uv_ws):
+        return self._by_uv_ws.get(uv_ws)
+
+    def bind_stream(self, session: Session, stream_sid: str):
+        """Attach the Twilio media stream to the session and index it."""
+        if session.stream_sid is not None:
+            self._by_stream_sid.pop(session.stream_sid, None)
+        session.stream_sid = stream_sid
+        self._by_stream_sid[stream_sid] = session
+        self._pending.pop(session.call_sid, None)
+        self.touch(session)
+
+    def bind_uv_ws(self, session: Session, uv_ws):
+        """Attach the Ultravox websocket to the session and index it."""
+        if session.uv_ws is not None:
+            self._by_uv_ws.pop(session.uv_ws, None)
+        session.uv_ws = uv_ws
+        self._by_uv_ws[uv_ws] = session
+
+    def remove(self, call_sid: str):
+        """Drop the session and its index entries; returns it, or None if unknown."""
+        session = self._by_call_sid.pop(call_sid, None)
+        if session is None:
+            return None
+        self._pending.pop(call_sid, None)
+        self._lru.pop(call_sid, None)
+        if session.stream_sid is not None and self._by_stream_sid.get(session.stream_sid) is session:
+            del self._by_stream_sid[session.stream_sid]
+        if session.uv_ws is not None and self._by_uv_ws.get(session.uv_ws) is session:
+            del self._by_uv_ws[session.uv_ws]
+        return session
+
+    def _evict(self, call_sid: str, reason: str):
+        session = self.remove(call_sid)
+        if session is not None:
+            session.discard()
+            self.evictions[reason].inc()
+
+    def sweep(self, create_ttl: float, idle_ttl: float, now: float = None) -> int:
+        """Evict sessions past their creation or idle TTL; returns how many were evicted."""
+        now = now if now is not None else time.monotonic()
+        evicted = 0
+        while self._pending:
+            call_sid, session = next(iter(self._pending.items()))
+            if now - session.created_at < create_ttl:
+                break
+            self._evict(call_sid, "no_stream")
+            evicted += 1
+        while self._lru:
+            call_sid, session = next(iter(self._lru.items()))
+            if now - session.last_activity < idle_ttl:
+                break
+            self._evict(call_sid, "idle")
+            evicted += 1
+        return evicted
+
+    def stats(self) -> dict:
+        return {
+            "live": len(self._by_call_sid),
+            "pending_stream": len(self._pending),
+            **{f"evicted_{reason}": counter.value for reason, counter in self.evictions.items()},
+        }
+
 
 # Global session store
-sessions = {}
+sessions = SessionRegistry(max_sessions=SESSION_MAX)
+
+
+@on_collect
+def _collect_sessions():
+    stats = sessions.stats()
+    SESSIONS_ACTIVE.labels("pending_stream").set(stats["pending_stream"])
+    SESSIONS_ACTIVE.labels("streaming").set(stats["live"] - stats["pending_stream"])
@@ -3,9 +3,17 @@ Main FastAPI application entry point.
 """
 import uvicorn
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from app.api.endpoints.calls import router as calls_router
 from app.websockets import media_stream
 from app.core.config import validate_config
+from app.services import http_clients, session_sweeper, loop_monitor
+from app.core import metrics
+from app.services.n8n_service import transcript_outbox
+from app.core.log import get_logger, setup_logging, shutdown_logging
+
+setup_logging()
+logger = get_logger("app.main")  # not __name__: run as a script that is "__main__", outside the "app" loggers
 
 # Create FastAPI app instance
 app = FastAPI(title="Ultravox Twilio Voice AI")
@@ -16,15 +24,32 @@ app.include_router(media_stream.router)
 # Register REST API endpoints
 app.include_router(calls_router)
 
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # Validate config on startup
 @app.on_event("startup")
 async def startup_event():
     validate_config()
-    print("✅ Config validated. Server ready.")
+    await http_clients.startup()
+    session_sweeper.start()
+    loop_monitor.start()
+    transcript_outbox.start()
+    logger.info("✅ Config validated. Server ready.")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await loop_monitor.stop()
+    await session_sweeper.stop()
+    await transcript_outbox.stop()
+    await http_clients.shutdown()
+    shutdown_logging()
 
 # Only used for local development
 if __name__ == "__main__":
     import os
     port = int(os.getenv("PORT", "8000"))
-    print(f"🚀 Starting local server on http://localhost:{port}")
+    logger.info("🚀 Starting local server on http://localhost:%s", port)
     uvicorn.run("app.main:app", host="0.0.0.0", port=port)
@@ -0,0 +1,40 @@
+"""
+Caller-profile lookup (n8n route 1), shared by everything that needs it during a call.
+
+/incoming-call starts one lookup per call and keeps the task on the session;
+the greeting and the check_returning_user tool both await that same task
+instead of each posting route 1 themselves. When a fresh cached greeting
+answers /incoming-call, no lookup starts until the tool asks for one.
+"""
+import asyncio
+from app.services.n8n_service import send_to_webhook
+from app.core.log import get_logger
+
+logger = get_logger(__name__)
+
+_lookups = {}  # caller number -> in-flight lookup task
+
+
+async def _fetch(caller_number: str):
+    try:
+        return await send_to_webhook({
+            "route": 1,
+            "number": caller_number,
+            "data": "empty"
+        })
+    except Exception as e:
+        logger.error("❌ Caller profile lookup failed for %s: %s", caller_number, e)
+        return None
+
+
+def lookup(caller_number: str) -> asyncio.Task:
+    """
+    Start (or join) the route 1 lookup for `caller_number`. The task's result
+    is n8n's raw response body, or None if n8n could not be reached. Await it
+    through asyncio.shield(), since other consumers may share it.
+    """
+    task = _lookups.get(caller_number)
+    if task is None:
+        task = _lookups[caller_number] = asyncio.create_task(_fetch(caller_number))
+        task.add_done_callback(lambda _: _lookups.pop(caller_number, None))
+    return task
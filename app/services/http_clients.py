@@ -0,0 +1,99 @@
+"""
+Shared, pooled HTTP clients for Ultravox, n8n and the Twilio REST API.
+
+Created once in the app's startup hook and closed at shutdown, so calls reuse
+warm keep-alive connections instead of paying a TCP + TLS handshake on the
+critical path of every request. One httpx client per upstream host gives each
+host its own pool limits; HTTP/2 is used when the `h2` package is installed.
+"""
+import asyncio
+from urllib.parse import urlsplit
+
+import httpx
+from app.core.config import (
+    N8N_WEBHOOK_URL,
+    ULTRAVOX_API_KEY,
+    ULTRAVOX_API_URL,
+    TWILIO_ACCOUNT_SID,
+    TWILIO_AUTH_TOKEN,
+    TWILIO_API_BASE_URL,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE,
+    HTTP_KEEPALIVE_EXPIRY,
+)
+from app.core.log import get_logger
+
+try:
+    import h2  # noqa: F401  (enables httpx HTTP/2 support)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = get_logger(__name__)
+
+_clients = {}
+
+
+def _build_client(name: str) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    if name == "ultravox":
+        return httpx.AsyncClient(
+            base_url=ULTRAVOX_API_URL,
+            headers={"X-API-Key": ULTRAVOX_API_KEY or ""},
+            http2=HTTP2_AVAILABLE,
+            limits=limits,
+            timeout=10.0,
+        )
+    if name == "n8n":
+        return httpx.AsyncClient(http2=HTTP2_AVAILABLE, limits=limits, timeout=10.0)
+    if name == "twilio":
+        return httpx.AsyncClient(
+            base_url=TWILIO_API_BASE_URL,
+            auth=(TWILIO_ACCOUNT_SID or "", TWILIO_AUTH_TOKEN or ""),
+            http2=HTTP2_AVAILABLE,
+            limits=limits,
+            timeout=10.0,
+        )
+    raise KeyError(f"Unknown HTTP client: {name}")
+
+
+def get_client(name: str) -> httpx.AsyncClient:
+    """Return the shared client for `name` ("ultravox", "n8n" or "twilio"), creating it if needed."""
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        client = _clients[name] = _build_client(name)
+    return client
+
+
+async def _warm_up(name: str, url: str):
+    """Open a pooled connection to `url`'s host; the response itself is irrelevant."""
+    try:
+        await get_client(name).head(url, timeout=3.0)
+        logger.info("🔥 Warmed up %s connection to %s", name, urlsplit(url).netloc)
+    except Exception as e:
+        logger.warning("⚠️ Could not warm up %s connection: %s", name, e)
+
+
+async def startup():
+    """Create every client and pre-open connections to the upstream hosts."""
+    get_client("ultravox")
+    get_client("n8n")
+    get_client("twilio")
+    logger.info("🌐 HTTP clients ready (HTTP/2: %s)", 'on' if HTTP2_AVAILABLE else 'off, h2 not installed')
+
+    warm_ups = [_warm_up("ultravox", ULTRAVOX_API_URL), _warm_up("twilio", TWILIO_API_BASE_URL)]
+    if N8N_WEBHOOK_URL:
+        parts = urlsplit(N8N_WEBHOOK_URL)
+        warm_ups.append(_warm_up("n8n", f"{parts.scheme}://{parts.netloc}/"))
+    await asyncio.gather(*warm_ups)
+
+
+async def shutdown():
+    for client in _clients.values():
+        await client.aclose()
+    _clients.clear()
+    logger.info("🌐 HTTP clients closed")
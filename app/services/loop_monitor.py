@@ -0,0 +1,92 @@
+"""
+Event-loop lag probe and blocking-call watchdog.
+
+Every call's audio is carried by the one asyncio loop, so time the loop
+spends stuck in a callback shows up directly as audio jitter. The probe
+sleeps on the loop and records how late it wakes up. A watchdog thread
+watches the probe's heartbeat; when the loop has been stuck for longer than
+LOOP_BLOCK_THRESHOLD_MS it logs the loop thread's stack while the offending
+callback is still running. With LOOP_STRICT_MS set, a stall longer than that
+stops the process, so load tests fail loudly on any blocking call.
+"""
+import sys
+import time
+import asyncio
+import threading
+import traceback
+from app.core.config import LOOP_LAG_INTERVAL, LOOP_BLOCK_THRESHOLD_MS, LOOP_STRICT_MS
+from app.core.metrics import counter, histogram
+from app.core.log import get_logger
+
+logger = get_logger(__name__)
+
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+loop_lag = histogram("event_loop_lag_seconds", "How late the event loop ran the lag probe's timer",
+                     buckets=LAG_BUCKETS).labels()
+loop_stalls = counter("event_loop_stalls_total",
+                      "Times the event loop was blocked longer than LOOP_BLOCK_THRESHOLD_MS").labels()
+
+_threshold = LOOP_BLOCK_THRESHOLD_MS / 1000
+_strict = LOOP_STRICT_MS / 1000
+# The probe must tick well inside the threshold for the watchdog to see a stall while it lasts
+_interval = min(LOOP_LAG_INTERVAL, _threshold / 2) if _threshold else LOOP_LAG_INTERVAL
+
+_task = None
+_watchdog = None
+_stopping = threading.Event()
+_beat = 0.0  # when the probe last started a sleep; written on the loop, read by the watchdog
+
+
+async def _run():
+    global _beat
+    while True:
+        started = _beat = time.monotonic()
+        await asyncio.sleep(_interval)
+        lag = max(0.0, time.monotonic() - started - _interval)
+        loop_lag.observe(lag)
+        if _strict and lag > _strict:
+            logger.critical("💥 Strict mode: event loop was blocked for %.0f ms (limit %.0f ms)",
+                            lag * 1000, LOOP_STRICT_MS)
+            # SystemExit escapes the event loop and stops the server
+            raise SystemExit(f"event loop blocked for {lag * 1000:.0f} ms (LOOP_STRICT_MS={LOOP_STRICT_MS:.0f})")
+
+
+def _watch(loop_thread_id: int):
+    reported = None
+    while not _stopping.wait(_threshold / 2):
+        beat = _beat
+        blocked = time.monotonic() - beat - _interval
+        if blocked <= _threshold or beat == reported:
+            continue
+        reported = beat
+        loop_stalls.inc()
+        frame = sys._current_frames().get(loop_thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else "  <unavailable>\n"
+        logger.warning("🐢 Event loop blocked for %.0f ms so far; loop thread is at:\n%s", blocked * 1000, stack.rstrip())
+
+
+def start():
+    global _task, _watchdog, _beat
+    if _task is None:
+        _beat = time.monotonic()
+        _task = asyncio.create_task(_run())
+    if _threshold and _watchdog is None:
+        _stopping.clear()
+        _watchdog = threading.Thread(target=_watch, args=(threading.get_ident(),),
+                                     name="loop-watchdog", daemon=True)
+        _watchdog.start()
+
+
+async def stop():
+    global _task, _watchdog
+    if _watchdog is not None:
+        _stopping.set()
+        _watchdog.join(timeout=1)
+        _watchdog = None
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
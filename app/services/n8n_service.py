@@ -2,34 +2,61 @@
 Services for handling webhook communications with detailed logging.
 """
 import json
+import time
 import httpx
 import asyncio
-from app.core.config import N8N_WEBHOOK_URL
+from app.core.config import (
+    N8N_WEBHOOK_URL,
+    OUTBOX_PATH,
+    OUTBOX_CONCURRENCY,
+    OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_BACKOFF_BASE,
+    OUTBOX_BACKOFF_MAX,
+    N8N_BATCH_ENABLED,
+    N8N_BATCH_WINDOW,
+    N8N_BATCH_SIZE,
+    N8N_BREAKER_FAILURES,
+    N8N_BREAKER_RESET,
+    N8N_HEDGE_ROUTES,
+    N8N_HEDGE_DELAY,
+)
+from app.services.http_clients import get_client
+from app.utils.outbox import Outbox
+from app.utils.batcher import Batcher
+from app.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.core.metrics import counter, histogram
+from app.core.log import get_logger, log_payload
+
+logger = get_logger(__name__)
 
 MAX_RETRIES = 3
 RETRY_DELAY = 1.5  # seconds
+HEDGE_MIN_SAMPLES = 20  # successful calls on a route before its own p95 sets the hedge delay
 
+N8N_LATENCY = histogram("n8n_webhook_seconds", "Successful n8n webhook POST latency", ("route",))
+N8N_HEDGED = counter("n8n_hedged_total", "Hedged (duplicate) n8n requests sent", ("route",))
 
-def detect_route(session: dict) -> int:
+
+def detect_route(session) -> int:
     """
     Detects the correct route to use in the webhook payload.
     Priority:
-    1. Use session["route"] if explicitly set
+    1. Use session.route if explicitly set
     2. Default to 2 if nothing is defined
     """
-    if "route" in session and isinstance(session["route"], int):
-        return session["route"]
+    if isinstance(session.route, int):
+        return session.route
     return 2  # Default fallback route
 
 
 async def send_transcript_to_n8n(session):
-    print("\n📝 send_transcript_to_n8n() called")
-    caller_number = session.get("callerNumber", "Unknown")
-    transcript = session.get("transcript", "")
+    logger.info("📝 send_transcript_to_n8n() called")
+    caller_number = session.caller_number
+    transcript = session.transcript.render()
     route = detect_route(session)
 
-    print(f"📞 Caller Number: {caller_number}")
-    print(f"🧭 Selected Route: {route}")
+    logger.info("📞 Caller Number: %s", caller_number)
+    logger.info("🧭 Selected Route: %s", route)
 
     payload = {
         "route": route,
@@ -37,63 +64,153 @@ async def send_transcript_to_n8n(session):
         "data": transcript
     }
 
-    await send_to_webhook(payload)
-    session['transcript_sent'] = True
-    print("✅ Transcript sent flag updated in session")
+    # Queued locally and delivered by the outbox worker, so call teardown never waits on n8n
+    row_id = transcript_outbox.enqueue(payload)
+    session.transcript_sent = True
+    logger.info("✅ Transcript queued for delivery (outbox #%s)", row_id)
+
+
+class WebhookError(Exception):
+    """n8n answered with a non-200 status."""
 
 
-async def send_to_webhook(payload: dict) -> str:
-    print("\n📨 send_to_webhook() called with payload:")
-    print(json.dumps(payload, indent=2))
+async def post_to_webhook(payload) -> str:
+    """
+    One POST of `payload` (a dict, or a list of them in batching mode) to
+    N8N_WEBHOOK_URL. Returns the response body;
+    raises WebhookError on a non-200 answer and httpx.RequestError on transport errors.
+    """
+    if not N8N_WEBHOOK_URL:
+        raise WebhookError("N8N_WEBHOOK_URL not set in environment")
+    response = await get_client("n8n").post(
+        N8N_WEBHOOK_URL,
+        json=payload,
+        headers={"Content-Type": "application/json"}
+    )
+
+    logger.info("🔄 Webhook Response Code: %s", response.status_code)
+    logger.info("📥 Response Body: %s", response.text)
+
+    if response.status_code != 200:
+        raise WebhookError(f"Non-200 response: {response.status_code}")
+    logger.info("✅ N8N webhook call successful")
+    return response.text
+
+
+class RouteState:
+    """Circuit breaker and latency history for one n8n route."""
+
+    __slots__ = ("breaker", "latency", "hedged")
+
+    def __init__(self, route: str):
+        self.breaker = CircuitBreaker(f"n8n_route{route}", N8N_BREAKER_FAILURES, N8N_BREAKER_RESET)
+        self.latency = N8N_LATENCY.labels(route)
+        self.hedged = N8N_HEDGED.labels(route)
+
+    def hedge_delay(self) -> float:
+        if self.latency.count < HEDGE_MIN_SAMPLES:
+            return N8N_HEDGE_DELAY
+        return self.latency.percentile(0.95)
+
+
+_routes = {}
+
+
+def route_state(route) -> RouteState:
+    route = str(route)
+    state = _routes.get(route)
+    if state is None:
+        state = _routes[route] = RouteState(route)
+    return state
+
+
+async def _timed_post(payload: dict, state: RouteState) -> str:
+    started = time.perf_counter()
+    text = await post_to_webhook(payload)
+    state.latency.observe(time.perf_counter() - started)
+    return text
+
+
+async def _hedged_post(payload: dict, state: RouteState) -> str:
+    """POST, and POST again if no answer within the route's p95; first success wins."""
+    delay = state.hedge_delay()
+    tasks = [asyncio.create_task(_timed_post(payload, state))]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            logger.info("🪁 No n8n answer after %.2fs, sending hedged request", delay)
+            state.hedged.inc()
+            tasks.append(asyncio.create_task(_timed_post(payload, state)))
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def send_to_webhook(payload: dict, max_retries: int = MAX_RETRIES) -> str:
+    """
+    POST `payload` with retries and return the response body (an error JSON
+    once retries are exhausted). Raises CircuitOpenError instead of waiting
+    while the route's circuit breaker is open.
+    """
+    logger.info("📨 send_to_webhook() called (route %s)", payload.get("route"))
+    log_payload(logger, "📨 Webhook payload", payload)
 
     if not N8N_WEBHOOK_URL:
         error_msg = "❌ N8N_WEBHOOK_URL not set in environment"
-        print(error_msg)
+        logger.error("%s", error_msg)
         return json.dumps({"error": error_msg})
 
+    route = str(payload.get("route"))
+    state = route_state(route)
+    post = _hedged_post if route in N8N_HEDGE_ROUTES else _timed_post
+
     attempt = 0
-    while attempt < MAX_RETRIES:
-        print(f"🌐 Attempting to call webhook (Attempt {attempt + 1}/{MAX_RETRIES})")
-        print(f"🔗 URL: {N8N_WEBHOOK_URL}")
+    while attempt < max_retries:
+        if not state.breaker.allow():
+            logger.warning("⚡ N8N route %s circuit open, failing fast", route)
+            raise CircuitOpenError(f"n8n route {route} is unavailable")
+        logger.info("🌐 Attempting to call webhook (Attempt %s/%s)", attempt + 1, max_retries)
+        logger.info("🔗 URL: %s", N8N_WEBHOOK_URL)
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.post(
-                    N8N_WEBHOOK_URL,
-                    json=payload,
-                    headers={"Content-Type": "application/json"}
-                )
-
-                print(f"🔄 Webhook Response Code: {response.status_code}")
-                print("📥 Response Body:", response.text)
-
-                if response.status_code == 200:
-                    print("✅ N8N webhook call successful")
-                    return response.text
-                else:
-                    print(f"⚠️ Non-200 response: {response.status_code}")
-
+            text = await post(payload, state)
+            state.breaker.record_success()
+            return text
+        except WebhookError as e:
+            logger.warning("⚠️ %s", e)
+            state.breaker.record_failure()
         except httpx.RequestError as e:
-            print(f"❌ RequestError on attempt {attempt + 1}: {str(e)}")
+            logger.error("❌ RequestError on attempt %s: %s", attempt + 1, str(e))
+            state.breaker.record_failure()
         except Exception as e:
-            print(f"❌ Unexpected error on attempt {attempt + 1}: {str(e)}")
+            logger.error("❌ Unexpected error on attempt %s: %s", attempt + 1, str(e))
+            state.breaker.record_failure()
 
         attempt += 1
-        if attempt < MAX_RETRIES:
-            print(f"⏳ Retrying in {RETRY_DELAY} seconds... (Next Attempt: {attempt + 1})")
+        if attempt < max_retries and state.breaker.state != CircuitBreaker.OPEN:
+            logger.warning("⏳ Retrying in %s seconds... (Next Attempt: %s)", RETRY_DELAY, attempt + 1)
             await asyncio.sleep(RETRY_DELAY)
 
-    error_summary = f"❌ Failed to reach N8N webhook after {MAX_RETRIES} attempts"
-    print(error_summary)
+    error_summary = f"❌ Failed to reach N8N webhook after {max_retries} attempts"
+    logger.error("%s", error_summary)
     return json.dumps({"error": error_summary})
 
 
 async def send_action_to_n8n(action: str, session_id: str, caller_number: str, extra_data: dict = None):
-    print(f"\n🚀 send_action_to_n8n() triggered")
-    print(f"🔧 Action: {action}")
-    print(f"🧾 Session ID: {session_id}")
-    print(f"📞 Caller Number: {caller_number}")
+    logger.info("🚀 send_action_to_n8n() triggered")
+    logger.info("🔧 Action: %s", action)
+    logger.info("🧾 Session ID: %s", session_id)
+    logger.info("📞 Caller Number: %s", caller_number)
     if extra_data:
-        print("📦 Extra Data:", json.dumps(extra_data, indent=2))
+        log_payload(logger, "📦 Extra Data", extra_data)
 
     payload = {
         "route": 3,
@@ -105,7 +222,33 @@ async def send_action_to_n8n(action: str, session_id: str, caller_number: str, e
     if extra_data:
         payload.update(extra_data)
 
-    print("📨 Final Payload to N8N:", json.dumps(payload, indent=2))
-    response = await send_to_webhook(payload)
-    print(f"📡 N8N responded to action '{action}': {response}")
+    log_payload(logger, "📨 Final Payload to N8N", payload)
+    try:
+        response = await send_to_webhook(payload)
+    except CircuitOpenError as e:
+        response = json.dumps({"error": str(e)})
+    logger.info("📡 N8N responded to action '%s': %s", action, response)
     return response
+
+
+# Batching only applies to outbox deliveries; send_to_webhook callers that read the
+# reply (route 1 greeting lookup, route 3 bookings) always POST on their own
+webhook_batcher = Batcher(
+    "n8n",
+    post_to_webhook,
+    max_size=N8N_BATCH_SIZE,
+    window=N8N_BATCH_WINDOW,
+    key=lambda payload: payload.get("route"),
+    concurrency=OUTBOX_CONCURRENCY,
+)
+
+transcript_outbox = Outbox(
+    "transcripts",
+    OUTBOX_PATH,
+    webhook_batcher.submit if N8N_BATCH_ENABLED else post_to_webhook,
+    # With batching on, enough rows are in flight to fill a batch per POST slot
+    concurrency=OUTBOX_CONCURRENCY * N8N_BATCH_SIZE if N8N_BATCH_ENABLED else OUTBOX_CONCURRENCY,
+    max_attempts=OUTBOX_MAX_ATTEMPTS,
+    backoff_base=OUTBOX_BACKOFF_BASE,
+    backoff_max=OUTBOX_BACKOFF_MAX,
+)
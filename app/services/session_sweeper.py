@@ -0,0 +1,43 @@
+"""
+Background sweeper that keeps the session store bounded.
+
+Sessions are normally removed when their media stream ends; this catches the
+rest: webhooks whose stream never opened and sessions left behind by a call
+that ended abnormally.
+"""
+import asyncio
+from app.core.shared_state import sessions
+from app.core.config import SESSION_CREATE_TTL, SESSION_IDLE_TTL, SESSION_SWEEP_INTERVAL
+from app.core.log import get_logger
+
+logger = get_logger(__name__)
+
+_task = None
+
+
+async def _run():
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL)
+        try:
+            evicted = sessions.sweep(SESSION_CREATE_TTL, SESSION_IDLE_TTL)
+            if evicted:
+                logger.info("🧹 Session sweep evicted %s session(s): %s", evicted, sessions.stats())
+        except Exception as e:
+            logger.exception("❌ Session sweep failed: %s", e)
+
+
+def start():
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(_run())
+
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
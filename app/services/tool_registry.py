@@ -0,0 +1,165 @@
+"""
+Table-driven registry for Ultravox client tools.
+
+Handlers are registered with `@tools.register(...)` and declare their
+parameter schema, timeout, retry policy and cacheability next to the code.
+The registry dispatches invocations, wraps results in the shared
+`client_tool_result` envelope, records per-tool latency and generates the
+`selectedTools` section of the Ultravox call payload.
+"""
+import json
+import time
+from app.core.config import TOOL_TIMEOUT, TOOL_CACHE_TTL
+from app.core.metrics import histogram
+from app.utils.ttl_cache import TTLCache
+
+TOOL_LATENCY = histogram("tool_seconds", "Tool invocation latency", ("tool",))
+
+
+class ToolError(Exception):
+    """Raised by a handler to answer the invocation with an error envelope."""
+
+    def __init__(self, error_type: str, error_message: str):
+        super().__init__(error_message)
+        self.error_type = error_type
+        self.error_message = error_message
+
+
+def tool_result(invocation_id: str, result: str, response_type: str = "tool-response") -> str:
+    return json.dumps({
+        "type": "client_tool_result",
+        "invocationId": invocation_id,
+        "result": result,
+        "response_type": response_type
+    })
+
+
+def tool_error(invocation_id: str, error_type: str, error_message: str) -> str:
+    return json.dumps({
+        "type": "client_tool_result",
+        "invocationId": invocation_id,
+        "error_type": error_type,
+        "error_message": error_message
+    })
+
+
+def param(name: str, description: str, type: str = "string", required: bool = True) -> dict:
+    """Declare one tool parameter."""
+    return {"name": name, "description": description, "type": type, "required": required}
+
+
+class ToolSpec:
+    """Declaration of one registered tool."""
+
+    __slots__ = ("name", "handler", "description", "parameters", "timeout", "retries",
+                 "cacheable", "http_url", "latency")
+
+    def __init__(self, name, handler, description, parameters, timeout, retries, cacheable, http_url):
+        self.name = name
+        self.handler = handler
+        self.description = description
+        self.parameters = list(parameters)
+        self.timeout = timeout
+        self.retries = retries
+        self.cacheable = cacheable
+        self.http_url = http_url
+        self.latency = TOOL_LATENCY.labels(name)
+
+    def ultravox_definition(self) -> dict:
+        """This tool as an Ultravox `temporaryTool` served directly over HTTP."""
+        return {
+            "temporaryTool": {
+                "modelToolName": self.name,
+                "description": self.description,
+                "dynamicParameters": [
+                    {
+                        "name": p["name"],
+                        "location": 4,  # PARAMETER_LOCATION_BODY
+                        "schema": {"type": p["type"], "description": p["description"]},
+                        "required": p["required"]
+                    }
+                    for p in self.parameters
+                ],
+                "timeout": f"{self.timeout:g}s",
+                "http": {
+                    "baseUrlPattern": self.http_url,
+                    "httpMethod": "POST"
+                }
+            }
+        }
+
+
+class ToolContext:
+    """What a handler gets besides its parameters; `session` is the calling Session, if known."""
+
+    __slots__ = ("uv_ws", "send", "invocation_id", "spec", "session")
+
+    def __init__(self, uv_ws, send, invocation_id: str, spec: ToolSpec, session=None):
+        self.uv_ws = uv_ws
+        self.send = send
+        self.invocation_id = invocation_id
+        self.spec = spec
+        self.session = session
+
+
+class ToolRegistry:
+    def __init__(self):
+        self._tools = {}
+        self._cache = TTLCache(maxsize=512, ttl=TOOL_CACHE_TTL)
+
+    def __contains__(self, name):
+        return name in self._tools
+
+    def get(self, name: str):
+        return self._tools.get(name)
+
+    def register(self, name: str, description: str = "", parameters=(), timeout: float = TOOL_TIMEOUT,
+                 retries: int = 1, cacheable: bool = False, http_url: str = None):
+        """
+        Decorator registering `async def handler(ctx, parameters)`.
+
+        The handler returns the result text, a (result, response_type) tuple,
+        or None if it already replied itself; it raises ToolError to reply
+        with an error. `retries` is the attempt budget for the handler's
+        webhook calls. Tools with an `http_url` are offered to Ultravox in
+        `selectedTools` and called by Ultravox directly.
+        """
+        def decorator(handler):
+            self._tools[name] = ToolSpec(name, handler, description, parameters,
+                                         timeout, retries, cacheable, http_url)
+            return handler
+        return decorator
+
+    def selected_tools(self) -> list:
+        return [spec.ultravox_definition() for spec in self._tools.values() if spec.http_url]
+
+    def latency_snapshot(self) -> dict:
+        return {name: spec.latency.snapshot() for name, spec in self._tools.items()}
+
+    async def invoke(self, uv_ws, send, name: str, invocation_id: str, parameters: dict, session=None):
+        """Run the handler for `name` and send its reply in the shared envelope."""
+        spec = self._tools[name]
+        started = time.perf_counter()
+        try:
+            cache_key = None
+            if spec.cacheable:
+                cache_key = (name, json.dumps(parameters, sort_keys=True, default=str))
+                cached, _ = self._cache.get(cache_key)
+                if cached is not None:
+                    await send(tool_result(invocation_id, *cached))
+                    return
+
+            try:
+                reply = await spec.handler(ToolContext(uv_ws, send, invocation_id, spec, session), parameters)
+            except ToolError as e:
+                await send(tool_error(invocation_id, e.error_type, e.error_message))
+                return
+            if reply is None:
+                return
+            if isinstance(reply, str):
+                reply = (reply, "tool-response")
+            if cache_key is not None:
+                self._cache.set(cache_key, reply)
+            await send(tool_result(invocation_id, *reply))
+        finally:
+            spec.latency.observe(time.perf_counter() - started)
@@ -0,0 +1,69 @@
+"""
+Per-call runner for Ultravox client tool invocations.
+
+Tools often wait on n8n webhooks (with retries), so they run as background
+tasks instead of being awaited inside the Ultravox receive loop; agent audio,
+transcripts and state messages keep flowing while a slow tool is in flight.
+"""
+import json
+import asyncio
+from app.services.tools_service import handle_tool_invocation, tools
+from app.core.config import TOOL_TIMEOUT
+from app.core.log import get_logger
+
+logger = get_logger(__name__)
+
+
+class ToolRunner:
+    """Task group for one call's tool invocations, each under its registered timeout."""
+
+    def __init__(self, uv_ws, send, session=None):
+        self._uv_ws = uv_ws
+        self._session = session
+        self._send = send
+        self._tasks = {}  # task -> tool name
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def submit(self, tool_name: str, invocation_id: str, parameters: dict):
+        """Start a tool invocation in the background and return immediately."""
+        if tool_name == "hangUp":
+            # Nothing else this call asked for matters once it is ending
+            self.cancel()
+        task = asyncio.create_task(self._run(tool_name, invocation_id, parameters))
+        self._tasks[task] = tool_name
+        task.add_done_callback(self._tasks.pop)
+
+    async def _run(self, tool_name: str, invocation_id: str, parameters: dict):
+        spec = tools.get(tool_name)
+        timeout = spec.timeout if spec else TOOL_TIMEOUT
+        try:
+            await asyncio.wait_for(
+                handle_tool_invocation(self._uv_ws, tool_name, invocation_id, parameters,
+                                       send=self._send, session=self._session),
+                timeout=timeout,
+            )
+        except asyncio.TimeoutError:
+            logger.warning("⏰ Tool '%s' (%s) timed out after %ss", tool_name, invocation_id, timeout)
+            await self._send_error(invocation_id, f"The {tool_name} tool took too long to respond.")
+        except Exception as e:
+            logger.exception("❌ Tool '%s' (%s) failed: %s", tool_name, invocation_id, e)
+            await self._send_error(invocation_id, f"The {tool_name} tool failed.")
+
+    async def _send_error(self, invocation_id: str, message: str):
+        try:
+            await self._send(json.dumps({
+                "type": "client_tool_result",
+                "invocationId": invocation_id,
+                "error_type": "implementation-error",
+                "error_message": message
+            }))
+        except Exception as e:
+            logger.error("❌ Could not report tool error to Ultravox: %s", e)
+
+    def cancel(self, keep=()):
+        """Cancel in-flight invocations, except tools named in `keep`."""
+        for task, tool_name in list(self._tasks.items()):
+            if tool_name not in keep:
+                task.cancel()
@@ -1,330 +1,276 @@
 """
 Services for handling tool invocations from Ultravox.
+
+Every tool is a handler registered on `tools` (see tool_registry.py). To add a
+tool, write an `async def handler(ctx, parameters)` below and decorate it with
+`@tools.register(...)`.
 """
 import json
-import traceback
+import asyncio
 import websockets
-from twilio.rest import Client
 #from pinecone_plugins.assistant.models.chat import Message
 from app.core.shared_state import sessions
 from app.services.n8n_service import send_to_webhook, send_transcript_to_n8n
+from app.services import caller_profile
+from app.services.tool_registry import ToolRegistry, ToolError, tool_result, param
 from app.utils.websocket_utils import safe_close_websocket
 from app.core.prompts import get_stage_prompt, get_stage_voice
-from app.core.config import (
-    CALENDARS_LIST,
-    TWILIO_ACCOUNT_SID,
-    TWILIO_AUTH_TOKEN,
-    PINECONE_API_KEY
-)
+from app.services import twilio_service
+from app.core.config import CALENDARS_LIST
+from app.core.log import get_logger, log_payload
+
+logger = get_logger(__name__)
+
+tools = ToolRegistry()
+
 
-async def handle_tool_invocation(uv_ws, toolName, invocationId, parameters):
+async def handle_tool_invocation(uv_ws, toolName, invocationId, parameters, send=None, session=None):
     """
-    Helper function to handle tool invocations detected in transcripts or direct invocations
+    Helper function to handle tool invocations detected in transcripts or direct invocations.
+    Results go out through `send` (the call's Ultravox writer queue) when given.
     """
-    print(f"Processing tool invocation: {toolName} with invocationId: {invocationId} and parameters: {parameters}")
-    
-    if toolName == "question_and_answer":
-        print("Q&A tool skipped: Pinecone not available")
-        tool_result = {
-        "type": "client_tool_result",
-        "invocationId": invocationId,
-        "result": "Sorry, I cannot answer that question right now.",
-        "response_type": "tool-response"
-    }
-        await uv_ws.send(json.dumps(tool_result))
+    logger.info("Processing tool invocation: %s with invocationId: %s and parameters: %s", toolName, invocationId, parameters)
+    if toolName not in tools:
+        logger.warning("Unknown tool: %s", toolName)
         return
+    if session is None:
+        session = sessions.by_uv_ws(uv_ws)
+    await tools.invoke(uv_ws, send or uv_ws.send, toolName, invocationId, parameters, session=session)
 
-    
 
-    elif toolName == "check_returning_user":
-        print(f"🔁 Checking returning user for number: {parameters}")
+@tools.register("question_and_answer", cacheable=True)
+async def question_and_answer(ctx, parameters):
+    logger.info("Q&A tool skipped: Pinecone not available")
+    return "Sorry, I cannot answer that question right now."
 
-        caller_number = parameters.get("caller_number")
 
-        payload = {
-            "route": "1",
-            "number": caller_number,
-            "data": {}
-        }
+@tools.register(
+    "check_returning_user",
+    description="Check if the caller has previously interacted and return a personalized greeting if found.",
+    parameters=[param("caller_number", "Phone number of the caller")],
+    timeout=10.0,
+    retries=3,
+    http_url="https://harbormoor.app.n8n.cloud/webhook/route1",
+)
+async def check_returning_user(ctx, parameters):
+    logger.info("🔁 Checking returning user for number: %s", parameters)
 
-        try:
-            webhook_response = await send_to_webhook(payload)
-            result = json.loads(webhook_response)
-
-            if isinstance(result, list) and len(result) > 0:
-    # Sort by row_number descending, use first
-                latest = sorted(result, key=lambda x: x.get("row_number", 0), reverse=True)[0]
-                message = latest.get("message", "Welcome back! How can I assist you today?")
-            else:
-                message = "Welcome to F3 Marina. How can I assist you today?"
-
-
-            await uv_ws.send(json.dumps({
-                "type": "client_tool_result",
-                "invocationId": invocationId,
-                "result": message,
-                "response_type": "tool-response"
-            }))
-        except Exception as e:
-            print(f"❌ Error in check_returning_user: {e}")
-            await uv_ws.send(json.dumps({
-                "type": "client_tool_result",
-                "invocationId": invocationId,
-                "result": "Sorry, I couldn’t check your info right now. How can I assist you today?",
-                "response_type": "tool-response"
-            }))
-
-
-
-    elif toolName == "verify":
-        print(f'Verifying customer identity with parameters: {parameters}')
-        # Extract verification parameters
-        full_name = parameters.get('full_name', '')
-        date_of_birth = parameters.get('date_of_birth', '')
-        policy_number = parameters.get('policy_number', '')
-        
-        # This is a mock verification - in a real system, you would check against a database
-        # For demo purposes, we'll consider verification successful if all fields are provided
-        verification_successful = all([full_name, date_of_birth, policy_number])
-        
-        # Send verification result back to the agent
-        verification_result = "Confirmed" if verification_successful else "Not Confirmed"
-        tool_result = {
-            "type": "client_tool_result",
-            "invocationId": invocationId,
-            "result": verification_result,
-            "response_type": "tool-response"
-        }
-        print(f"Verification result: {verification_result}")
-        await uv_ws.send(json.dumps(tool_result))
-    
-    elif toolName == "calendar_book":
-        print(f"📅 Invoked 'calendar_book' with params: {parameters}")
+    caller_number = parameters.get("caller_number")
 
-        # Extract from Ultravox params
-        name = parameters.get("name")
-        email = parameters.get("email")
-        purpose = parameters.get("purpose")
-        datetime_str = parameters.get("datetime")
-        calendar_id = parameters.get("calendar_id")
-
-        if not all([name, email, purpose, datetime_str, calendar_id]):
-            msg = "Missing parameters for booking. Need: name, email, purpose, datetime, calendar_id."
-            print(msg)
-            await uv_ws.send(json.dumps({
-                "type": "client_tool_result",
-                "invocationId": invocationId,
-                "result": msg,
-                "response_type": "tool-response"
-            }))
-            return
-
-        # 🔗 Send to n8n webhook
-        call_sid = None
-        session = None
-        for sid, sess in sessions.items():
-            if sess.get("uv_ws") == uv_ws:
-                call_sid = sid
-                session = sess
-                break
+    # Reuse the lookup /incoming-call started for this caller rather than asking n8n again;
+    # after a fresh greeting-cache hit there is none yet, so it starts here
+    session = ctx.session
+    if session and caller_number in (None, "Unknown"):
+        caller_number = session.caller_number
+    if session and session.caller_lookup and caller_number == session.caller_number:
+        lookup = session.caller_lookup
+    else:
+        lookup = caller_profile.lookup(caller_number)
 
-        payload = {
-            "route": "3",
-            "number": session.get("callerNumber", "Unknown"),
-            "data": json.dumps({
-                "name": name,
-                "email": email,
-                "purpose": purpose,
-                "datetime": datetime_str,
-                "calendar_id": calendar_id
-            })
-        }
+    try:
+        webhook_response = await asyncio.shield(lookup)
+        if webhook_response is None:
+            raise RuntimeError("caller profile lookup failed")
+        result = json.loads(webhook_response)
 
-        try:
-            webhook_response = await send_to_webhook(payload)
-            result = json.loads(webhook_response).get("message", "Booking confirmed.")
-
-            await uv_ws.send(json.dumps({
-                "type": "client_tool_result",
-                "invocationId": invocationId,
-                "result": result,
-                "response_type": "tool-response"
-            }))
-        except Exception as e:
-            print(f"❌ Error in calendar_book: {e}")
-            await uv_ws.send(json.dumps({
-                "type": "client_tool_result",
-                "invocationId": invocationId,
-                "error_type": "booking_error",
-                "error_message": "Calendar booking failed due to a server error."
-            }))
-
-
-    #meeting handling
-    elif toolName == "schedule_meeting":
-        print(f'Arguments passed to schedule_meeting tool: {parameters}')
-        # Validate required parameters
-        required_params = ["name", "email", "purpose", "datetime", "location"]
-        missing_params = [param for param in required_params if not parameters.get(param)]
-
-        if missing_params:
-            print(f"Missing parameters for schedule_meeting: {missing_params}")
-
-            # Inform the agent to prompt the user for missing parameters
-            prompt_message = f"Please provide the following information to schedule your meeting: {', '.join(missing_params)}."
-            tool_result = {
-                "type": "client_tool_result",
-                "invocationId": invocationId,
-                "result": prompt_message,
-                "response_type": "tool-response"
-            }
-            await uv_ws.send(json.dumps(tool_result))
-        else:
-            await handle_schedule_meeting(uv_ws, None, invocationId, parameters)
-    
-    elif toolName == "escalate_to_manager":
-        print(f'Escalating to manager with parameters: {parameters}')
-        issue_type = parameters.get('issue_type', '')
-        issue_details = parameters.get('issue_details', '')
-        customer_name = parameters.get('customer_name', '')
-        
-        # Get manager stage system prompt
-        manager_prompt = get_stage_prompt('manager')
-        manager_voice = get_stage_voice('manager')
-        
-        # The transfer intro is handled by the AI, we don't need to include it in the toolResultText
-        # Instead, we'll provide a greeting from the manager directly
-        manager_greeting = f"You're now speaking with Alex, the Senior Manager at SecureLife Insurance. I've been briefed on your situation{', ' + customer_name if customer_name else ''}. You're concerned about {issue_type}. How can I help you today?"
-        
-        # Prepare tool result with stage transition
-        stage_result = {
-            "type": "client_tool_result",
-            "invocationId": invocationId,
-            "result": json.dumps({
-                "systemPrompt": manager_prompt,
-                "voice": manager_voice,
-                "toolResultText": manager_greeting
-            }),
-            "response_type": "new-stage"
-        }
-        
-        print(f"Transitioning to manager stage with voice: {manager_voice}")
-        await uv_ws.send(json.dumps(stage_result))
-    
-    # Return to claim handling is no longer a separate tool according to the diagram
-    # The manager can return the customer to claim handling as a direct transition
-    
-    elif toolName == "move_to_call_summary":
-        print(f'Moving to call summary stage with parameters: {parameters}')
-        # Get call summary stage system prompt
-        summary_prompt = get_stage_prompt('call_summary')
-        summary_voice = get_stage_voice('call_summary')
-        
-        # Create stage transition response
-        stage_transition_msg = "Before we conclude our call, let me summarize what we've discussed and next steps."
-        
-        # Prepare tool result with stage transition
-        stage_result = {
-            "type": "client_tool_result",
-            "invocationId": invocationId,
-            "result": json.dumps({
-                "systemPrompt": summary_prompt,
-                "voice": summary_voice,
-                "toolResultText": stage_transition_msg
-            }),
-            "response_type": "new-stage"
-        }
-        
-        print(f"Transitioning to call summary stage with voice: {summary_voice}")
-        await uv_ws.send(json.dumps(stage_result))
-    
-    elif toolName == "hangUp":
-        print("Received hangUp tool invocation")
-        # Get the call_sid and session from the global sessions dictionary
-        call_sid = None
-        session = None
-        
-        # Find the session for this websocket connection
-        for sid, sess in sessions.items():
-            if sess.get('uv_ws') == uv_ws:
-                call_sid = sid
-                session = sess
-                break
-        
-        print(f"Ending call from hangUp tool invocation (CallSid={call_sid})")
-        
-        # Update the session's state to indicate the call is ending
-        if session:
-            # Indicate that we're in the process of hanging up
-            session['hanging_up'] = True
-        
-        try:
-            # First send success response before closing WebSocket
-            tool_result = {
-                "type": "client_tool_result",
-                "invocationId": invocationId,
-                "result": "Call ended successfully",
-                "response_type": "tool-response"
-            }
-            # Get the WebSocket state flag from the calling function if available
-            ultravox_active = session.get('ultravox_ws_active', True) if session else True
-            
-            if ultravox_active and uv_ws and uv_ws.state == websockets.protocol.State.OPEN:
-                await uv_ws.send(json.dumps(tool_result))
-                # If we're in the media_stream function, update the state
-                if 'ultravox_ws_active' in session:
-                    session['ultravox_ws_active'] = False
-        except Exception as e:
-            print(f"Error sending hangUp response: {e}")
-        
-        try:
-            # End Twilio call if we have a call_sid
-            if call_sid:
-                client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-                
-                # Ensure call_sid is properly formatted
-                call_sid_str = str(call_sid)
-                if len(call_sid_str) > 34 and 'CA' in call_sid_str:
-                    start_idx = call_sid_str.find('CA')
-                    extracted_sid = call_sid_str[start_idx:start_idx+34]
-                    if len(extracted_sid) == 34:
-                        call_sid = extracted_sid
-                
-                # Fetch the call and end it
-                call = client.calls(call_sid).fetch()
-                client.calls(call_sid).update(status='completed')
-                print(f"Successfully ended Twilio call: {call_sid}")
-            
-                # Send transcript to N8N and cleanup session
-                if session:
-                    # Only send transcript if it hasn't been sent already
-                    if not session.get('transcript_sent', False):
-                        await send_transcript_to_n8n(session)
-                    # Don't remove session here, it will be removed in media_stream.py
-        except Exception as e:
-            print(f"Error ending Twilio call: {e}")
-            traceback.print_exc()
-        
-        # Finally, close Ultravox WebSocket using our safe utility
-        await safe_close_websocket(uv_ws, name="Ultravox WebSocket (hangUp)")
-    else:
-        print(f"Unknown tool: {toolName}")
+        if isinstance(result, list) and len(result) > 0:
+            # Sort by row_number descending, use first
+            latest = sorted(result, key=lambda x: x.get("row_number", 0), reverse=True)[0]
+            return latest.get("message", "Welcome back! How can I assist you today?")
+        return "Welcome to F3 Marina. How can I assist you today?"
+    except Exception as e:
+        logger.error("❌ Error in check_returning_user: %s", e)
+        return "Sorry, I couldn’t check your info right now. How can I assist you today?"
+
+
+@tools.register("verify")
+async def verify(ctx, parameters):
+    logger.info("Verifying customer identity with parameters: %s", parameters)
+    # Extract verification parameters
+    full_name = parameters.get('full_name', '')
+    date_of_birth = parameters.get('date_of_birth', '')
+    policy_number = parameters.get('policy_number', '')
+
+    # This is a mock verification - in a real system, you would check against a database
+    # For demo purposes, we'll consider verification successful if all fields are provided
+    verification_successful = all([full_name, date_of_birth, policy_number])
+
+    verification_result = "Confirmed" if verification_successful else "Not Confirmed"
+    logger.info("Verification result: %s", verification_result)
+    return verification_result
 
 
-async def handle_question_and_answer(uv_ws, invocationId: str, question: str):
-    print("Pinecone is not available. Skipping question_and_answer tool.")
+@tools.register("calendar_book", timeout=20.0, retries=3)
+async def calendar_book(ctx, parameters):
+    logger.info("📅 Invoked 'calendar_book' with params: %s", parameters)
 
-    tool_result = {
-        "type": "client_tool_result",
-        "invocationId": invocationId,
-        "result": "Sorry, I can't answer that question right now.",
-        "response_type": "tool-response"
+    # Extract from Ultravox params
+    name = parameters.get("name")
+    email = parameters.get("email")
+    purpose = parameters.get("purpose")
+    datetime_str = parameters.get("datetime")
+    calendar_id = parameters.get("calendar_id")
+
+    if not all([name, email, purpose, datetime_str, calendar_id]):
+        msg = "Missing parameters for booking. Need: name, email, purpose, datetime, calendar_id."
+        logger.warning("%s", msg)
+        return msg
+
+    # 🔗 Send to n8n webhook
+    session = ctx.session
+
+    payload = {
+        "route": "3",
+        "number": session.caller_number if session else "Unknown",
+        "data": json.dumps({
+            "name": name,
+            "email": email,
+            "purpose": purpose,
+            "datetime": datetime_str,
+            "calendar_id": calendar_id
+        })
     }
-    await uv_ws.send(json.dumps(tool_result))
-            
-async def handle_schedule_meeting(uv_ws, session, invocationId: str, parameters):
+
+    try:
+        webhook_response = await send_to_webhook(payload, max_retries=ctx.spec.retries)
+        return json.loads(webhook_response).get("message", "Booking confirmed.")
+    except Exception as e:
+        logger.error("❌ Error in calendar_book: %s", e)
+        raise ToolError("booking_error", "Calendar booking failed due to a server error.")
+
+
+#meeting handling
+@tools.register(
+    "schedule_meeting",
+    description="Schedule a meeting for a customer. Returns a message indicating whether the booking was successful or not.",
+    parameters=[
+        param("name", "Customer's full name"),
+        param("email", "Customer's email"),
+        param("purpose", "Purpose of the Meeting"),
+        param("datetime", "Meeting Datetime"),
+        param("calendar_id", "ID of the calendar to schedule the meeting in"),
+    ],
+    timeout=20.0,
+    retries=3,
+    http_url="https://harbormoor.app.n8n.cloud/webhook/route3",
+)
+async def schedule_meeting(ctx, parameters):
+    logger.info("Arguments passed to schedule_meeting tool: %s", parameters)
+    # Validate required parameters
+    required_params = ["name", "email", "purpose", "datetime", "location"]
+    missing_params = [param for param in required_params if not parameters.get(param)]
+
+    if missing_params:
+        logger.warning("Missing parameters for schedule_meeting: %s", missing_params)
+
+        # Inform the agent to prompt the user for missing parameters
+        return f"Please provide the following information to schedule your meeting: {', '.join(missing_params)}."
+    return await handle_schedule_meeting(ctx.session, parameters, max_retries=ctx.spec.retries)
+
+
+@tools.register("escalate_to_manager")
+async def escalate_to_manager(ctx, parameters):
+    logger.info("Escalating to manager with parameters: %s", parameters)
+    issue_type = parameters.get('issue_type', '')
+    issue_details = parameters.get('issue_details', '')
+    customer_name = parameters.get('customer_name', '')
+
+    # Get manager stage system prompt
+    manager_prompt = get_stage_prompt('manager')
+    manager_voice = get_stage_voice('manager')
+
+    # The transfer intro is handled by the AI, we don't need to include it in the toolResultText
+    # Instead, we'll provide a greeting from the manager directly
+    manager_greeting = f"You're now speaking with Alex, the Senior Manager at SecureLife Insurance. I've been briefed on your situation{', ' + customer_name if customer_name else ''}. You're concerned about {issue_type}. How can I help you today?"
+
+    logger.info("Transitioning to manager stage with voice: %s", manager_voice)
+    return json.dumps({
+        "systemPrompt": manager_prompt,
+        "voice": manager_voice,
+        "toolResultText": manager_greeting
+    }), "new-stage"
+
+# Return to claim handling is no longer a separate tool according to the diagram
+# The manager can return the customer to claim handling as a direct transition
+
+
+@tools.register("move_to_call_summary")
+async def move_to_call_summary(ctx, parameters):
+    logger.info("Moving to call summary stage with parameters: %s", parameters)
+    # Get call summary stage system prompt
+    summary_prompt = get_stage_prompt('call_summary')
+    summary_voice = get_stage_voice('call_summary')
+
+    # Create stage transition response
+    stage_transition_msg = "Before we conclude our call, let me summarize what we've discussed and next steps."
+
+    logger.info("Transitioning to call summary stage with voice: %s", summary_voice)
+    return json.dumps({
+        "systemPrompt": summary_prompt,
+        "voice": summary_voice,
+        "toolResultText": stage_transition_msg
+    }), "new-stage"
+
+
+@tools.register("hangUp", timeout=15.0)
+async def hang_up(ctx, parameters):
+    logger.info("Received hangUp tool invocation")
+    uv_ws = ctx.uv_ws
+    session = ctx.session
+    call_sid = session.call_sid if session else None
+
+    logger.info("Ending call from hangUp tool invocation (CallSid=%s)", call_sid)
+
+    # Update the session's state to indicate the call is ending
+    if session:
+        # Indicate that we're in the process of hanging up
+        session.hanging_up = True
+
+    try:
+        # First send success response before closing WebSocket.
+        # Sent directly rather than via ctx.send: the socket is closed right after.
+        # Get the WebSocket state flag from the calling function if available
+        ultravox_active = session.ultravox_ws_active if session else True
+
+        if ultravox_active and uv_ws and uv_ws.state == websockets.protocol.State.OPEN:
+            await uv_ws.send(tool_result(ctx.invocation_id, "Call ended successfully"))
+            if session:
+                session.ultravox_ws_active = False
+    except Exception as e:
+        logger.error("Error sending hangUp response: %s", e)
+
+    try:
+        # End Twilio call if we have a call_sid
+        if call_sid:
+            # Ensure call_sid is properly formatted
+            call_sid_str = str(call_sid)
+            if len(call_sid_str) > 34 and 'CA' in call_sid_str:
+                start_idx = call_sid_str.find('CA')
+                extracted_sid = call_sid_str[start_idx:start_idx+34]
+                if len(extracted_sid) == 34:
+                    call_sid = extracted_sid
+
+            # End it with one non-blocking update over the pooled client
+            await twilio_service.end_call(call_sid)
+            logger.info("Successfully ended Twilio call: %s", call_sid)
+
+            # Send transcript to N8N and cleanup session
+            if session:
+                # Only send transcript if it hasn't been sent already
+                if not session.transcript_sent:
+                    session.flush_transcript()
+                    await send_transcript_to_n8n(session)
+                # Don't remove session here, it will be removed in media_stream.py
+    except Exception as e:
+        logger.exception("Error ending Twilio call: %s", e)
+
+    # Finally, close Ultravox WebSocket using our safe utility
+    await safe_close_websocket(uv_ws, name="Ultravox WebSocket (hangUp)")
+
+
+async def handle_schedule_meeting(session, parameters, max_retries: int = 3) -> str:
     """
-    Uses N8N to finalize a meeting schedule.
+    Uses N8N to finalize a meeting schedule. Returns the booking message.
     """
     try:
         name = parameters.get("name")
@@ -333,12 +279,12 @@ async def handle_schedule_meeting(uv_ws, session, invocationId: str, parameters)
         datetime_str = parameters.get("datetime")
         location = parameters.get("location")
 
-        print(f"Received schedule_meeting parameters: name={name}, email={email}, purpose={purpose}, datetime={datetime_str}, location={location}")
+        logger.info("Received schedule_meeting parameters: name=%s, email=%s, purpose=%s, datetime=%s, location=%s", name, email, purpose, datetime_str, location)
 
         # Validate parameters
         if not all([name, email, purpose, datetime_str, location]):
             raise ValueError("One or more required parameters are missing.")
-        
+
         calendars = CALENDARS_LIST
         calendar_id = calendars.get(location, None)
         if not calendar_id:
@@ -355,33 +301,18 @@ async def handle_schedule_meeting(uv_ws, session, invocationId: str, parameters)
         # Fire off the scheduling request to N8N
         payload = {
             "route": "3",
-            "number": session.get("callerNumber", "Unknown"),
+            "number": session.caller_number if session else "Unknown",
             "data": json.dumps(data)
         }
-        print(f"Sending payload to N8N: {json.dumps(payload, indent=2)}")
-        webhook_response = await send_to_webhook(payload)
+        log_payload(logger, "Sending payload to N8N", payload)
+        webhook_response = await send_to_webhook(payload, max_retries=max_retries)
         parsed_response = json.loads(webhook_response)
-        booking_message = parsed_response.get('message', 
+        booking_message = parsed_response.get('message',
             "I'm sorry, I couldn't schedule the meeting at this time.")
 
-        # Return the final outcome to Ultravox
-        tool_result = {
-            "type": "client_tool_result",
-            "invocationId": invocationId,
-            "result": booking_message,
-            "response_type": "tool-response"
-        }
-        await uv_ws.send(json.dumps(tool_result))
-        print(f"Sent schedule_meeting result to Ultravox: {booking_message}")
+        logger.info("Sent schedule_meeting result to Ultravox: %s", booking_message)
+        return booking_message
 
     except Exception as e:
-        print(f"Error scheduling meeting: {e}")
-        # Send error result back to Ultravox
-        error_result = {
-            "type": "client_tool_result",
-            "invocationId": invocationId,
-            "error_type": "implementation-error",
-            "error_message": "An error occurred while scheduling your meeting."
-        }
-        await uv_ws.send(json.dumps(error_result))
-        print("Sent error message for schedule_meeting to Ultravox.")
\ No newline at end of file
+        logger.error("Error scheduling meeting: %s", e)
+        raise ToolError("implementation-error", "An error occurred while scheduling your meeting.")
@@ -0,0 +1,36 @@
+"""
+Async Twilio call control over the shared, pooled Twilio REST client.
+"""
+from app.core.config import TWILIO_ACCOUNT_SID
+from app.core.metrics import counter
+from app.services.http_clients import get_client
+
+calls_ended = counter("twilio_calls_ended_total", "Calls ended through the Twilio REST API").labels()
+call_control_failures = counter("twilio_call_control_failures_total", "Failed Twilio call-control requests").labels()
+
+
+class TwilioCallError(Exception):
+    """Twilio refused or could not be reached for a call-control request."""
+
+
+async def end_call(call_sid: str):
+    """
+    Complete an in-progress call with a single Calls update (no fetch first).
+    Raises TwilioCallError if Twilio doesn't accept it.
+    """
+    url = f"/2010-04-01/Accounts/{TWILIO_ACCOUNT_SID}/Calls/{call_sid}.json"
+    try:
+        response = await get_client("twilio").post(url, data={"Status": "completed"})
+    except Exception as e:
+        call_control_failures.inc()
+        raise TwilioCallError(f"Twilio unreachable ending call {call_sid}: {e}") from e
+
+    if not response.is_success:
+        call_control_failures.inc()
+        try:
+            detail = response.json().get("message", response.text)
+        except ValueError:
+            detail = response.text
+        raise TwilioCallError(f"Twilio returned {response.status_code} ending call {call_sid}: {detail}")
+
+    calls_ended.inc()
@@ -1,32 +1,36 @@
 """
 Services for interacting with Ultravox voice AI.
 """
-import json
-import httpx
-import requests
+import time
 from app.core.prompts import get_personalized_system_message
+from app.services.http_clients import get_client
+from app.services.tools_service import tools
 from app.core.config import (
-    ULTRAVOX_API_KEY,
     ULTRAVOX_MODEL, 
     ULTRAVOX_VOICE, 
     ULTRAVOX_SAMPLE_RATE,
     ULTRAVOX_BUFFER_SIZE
 )
+from app.core.metrics import histogram
+from app.core.log import get_logger, log_payload
+
+logger = get_logger(__name__)
+
+ULTRAVOX_LATENCY = histogram("ultravox_request_seconds", "Ultravox call creation and WebSocket connect latency", ("op",))
 
 
 async def create_ultravox_call(system_prompt: str, first_message: str, agent_id: str, voice: str) -> str:
     """
     Creates a new Ultravox call in serverWebSocket mode and returns the joinUrl.
     """
-    url = "https://api.ultravox.ai/api/calls"
+    url = "/api/calls"
     headers = {
-        "X-API-Key": ULTRAVOX_API_KEY,
         "Content-Type": "application/json"
     }
 
-    print("\n🎤 [create_ultravox_call] Starting Ultravox call creation")
-    print("🗣️ First Message:", first_message)
-    print("📞 Caller Number (agent_id):", agent_id)
+    logger.info("🎤 [create_ultravox_call] Starting Ultravox call creation")
+    logger.info("🗣️ First Message: %s", first_message)
+    logger.info("📞 Caller Number (agent_id): %s", agent_id)
 
     payload = {
         "systemPrompt": system_prompt,
@@ -51,71 +55,33 @@ async def create_ultravox_call(system_prompt: str, first_message: str, agent_id:
             "minimumTurnDuration": "0s",
             "minimumInterruptionDuration": "0.09s"
         },
-        "selectedTools": [
-            {
-                "temporaryTool": {
-                    "modelToolName": "check_returning_user",
-                    "description": "Check if the caller has previously interacted and return a personalized greeting if found.",
-                    "dynamicParameters": [
-                        {
-                            "name": "caller_number",
-                            "location": 4,
-                            "schema": {"type": "string", "description": "Phone number of the caller"},
-                            "required": True
-                        }
-                    ],
-                    "timeout": "10s",
-                    "http": {
-                        "baseUrlPattern": "https://harbormoor.app.n8n.cloud/webhook/route1",
-                        "httpMethod": "POST"
-                    }
-                }
-            },
-            {
-                "temporaryTool": {
-                    "modelToolName": "schedule_meeting",
-                    "description": "Schedule a meeting for a customer. Returns a message indicating whether the booking was successful or not.",
-                    "dynamicParameters": [
-                        {"name": "name", "location": 4, "schema": {"type": "string", "description": "Customer's full name"}, "required": True},
-                        {"name": "email", "location": 4, "schema": {"type": "string", "description": "Customer's email"}, "required": True},
-                        {"name": "purpose", "location": 4, "schema": {"type": "string", "description": "Purpose of the Meeting"}, "required": True},
-                        {"name": "datetime", "location": 4, "schema": {"type": "string", "description": "Meeting Datetime"}, "required": True},
-                        {"name": "calendar_id", "location": 4, "schema": {"type": "string", "description": "ID of the calendar to schedule the meeting in"}, "required": True}
-                    ],
-                    "timeout": "20s",
-                    "http": {
-                        "baseUrlPattern": "https://harbormoor.app.n8n.cloud/webhook/route3",
-                        "httpMethod": "POST"
-                    }
-                }
-            }
-        ],
+        "selectedTools": tools.selected_tools(),
         "metadata": {
             "caller_number": agent_id
         }
     }
 
-    print("📤 Payload being sent to Ultravox:")
-    print(json.dumps(payload, indent=2))
+    log_payload(logger, "📤 Payload being sent to Ultravox", payload)
 
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(url, headers=headers, json=payload)
-            print("📬 Ultravox API response status:", resp.status_code)
-            try:
-                print("📦 Ultravox API JSON response:", resp.json())
-            except Exception:
-                print("📦 Ultravox API text response:", await resp.text())
+        # Shared pooled client: base URL and X-API-Key are set on the client
+        started = time.perf_counter()
+        resp = await get_client("ultravox").post(url, headers=headers, json=payload)
+        ULTRAVOX_LATENCY.labels("create_call").observe(time.perf_counter() - started)
+        logger.info("📬 Ultravox API response status: %s", resp.status_code)
+        try:
+            logger.info("📦 Ultravox API JSON response: %s", resp.json())
+        except Exception:
+            logger.info("📦 Ultravox API text response: %s", resp.text)
 
-            resp.raise_for_status()  # will raise if status code is not 2xx
+        resp.raise_for_status()  # will raise if status code is not 2xx
 
         body = resp.json()
         join_url = body.get("joinUrl", "")
-        print("✅ Ultravox joinUrl received:", join_url)
+        logger.info("✅ Ultravox joinUrl received: %s", join_url)
         return join_url
 
     except Exception as e:
-        print("❌ Ultravox create call request failed:", str(e))
-        print("🚫 Failed Payload:")
-        print(json.dumps(payload, indent=2))
+        logger.error("❌ Ultravox create call request failed: %s", str(e))
+        log_payload(logger, "🚫 Failed Payload", payload)
         return ""
@@ -0,0 +1,78 @@
+"""
+Groups items submitted by concurrent callers into batches.
+"""
+import time
+import asyncio
+from app.core.metrics import histogram
+
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+BATCH_SIZE = histogram("batch_size", "Items per flushed batch", ("batcher",), BATCH_SIZE_BUCKETS)
+BATCH_FLUSH_LATENCY = histogram("batch_flush_seconds", "Time from a batch's first item to its flush completing", ("batcher",))
+
+
+class Batcher:
+    """
+    Collects submitted items per key and hands each group to `flush(items)`
+    once it reaches `max_size` items or `window` seconds after its first item,
+    whichever comes first. Every submitter gets the flush's return value, or
+    its exception.
+    """
+
+    def __init__(self, name: str, flush, max_size: int, window: float, key=None, concurrency: int = 4):
+        self.name = name
+        self.flush = flush
+        self.max_size = max(1, max_size)
+        self.window = window
+        self.key = key or (lambda item: None)
+        self.batch_size = BATCH_SIZE.labels(name)
+        self.flush_latency = BATCH_FLUSH_LATENCY.labels(name)
+        self._concurrency = max(1, concurrency)
+        self._slots = None
+        self._groups = {}  # key -> [items, futures, opened_at, timer]
+
+    async def submit(self, item):
+        key = self.key(item)
+        group = self._groups.get(key)
+        loop = asyncio.get_running_loop()
+        if group is None:
+            timer = loop.call_later(self.window, self._flush_group, key)
+            group = self._groups[key] = [[], [], time.monotonic(), timer]
+        future = loop.create_future()
+        group[0].append(item)
+        group[1].append(future)
+        if len(group[0]) >= self.max_size:
+            self._flush_group(key)
+        return await future
+
+    def _flush_group(self, key):
+        group = self._groups.pop(key, None)
+        if group is None:
+            return
+        items, futures, opened_at, timer = group
+        timer.cancel()
+        asyncio.get_running_loop().create_task(self._send(items, futures, opened_at))
+
+    async def _send(self, items, futures, opened_at):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._concurrency)
+        async with self._slots:
+            try:
+                result = await self.flush(items)
+            except Exception as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for future in futures:
+                    if not future.done():
+                        future.set_result(result)
+            finally:
+                self.batch_size.observe(len(items))
+                self.flush_latency.observe(time.monotonic() - opened_at)
+
+    def stats(self) -> dict:
+        return {
+            "open_batches": len(self._groups),
+            "batch_size": self.batch_size.snapshot(),
+            "flush_latency": self.flush_latency.snapshot(),
+        }
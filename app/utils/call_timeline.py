@@ -0,0 +1,77 @@
+"""
+Per-call latency timeline.
+
+Each session records when it passed the call-setup milestones, relative to
+the Twilio webhook, and how long every agent turn took to start speaking.
+At teardown the timeline is logged as one record and folded into histograms,
+so slow pickups can be attributed to n8n, Ultravox or this service.
+"""
+import time
+from app.core.metrics import histogram
+
+# Call-setup milestones, in the order a healthy call passes them
+MILESTONES = (
+    "webhook_received",        # Twilio POST /incoming-call
+    "greeting_resolved",       # first message known (n8n, cache or default)
+    "twiml_returned",          # TwiML response built
+    "stream_started",          # media stream 'start' event
+    "ultravox_call_created",   # Ultravox joinUrl received
+    "ultravox_connected",      # Ultravox WebSocket open
+    "first_agent_audio",       # first agent frame forwarded to Twilio
+)
+
+MILESTONE_SECONDS = histogram("call_milestone_seconds", "Time from the Twilio webhook to each call-setup milestone",
+                              ("milestone",))
+TURN_LATENCY = histogram("call_turn_latency_seconds", "User end of speech to first agent audio forwarded to Twilio")
+
+_milestone_hists = {name: MILESTONE_SECONDS.labels(name) for name in MILESTONES}
+_turn_latency = TURN_LATENCY.labels()
+
+
+class CallTimeline:
+    """Monotonic milestone timestamps and per-turn response latencies for one call."""
+
+    __slots__ = ("origin", "marks", "turns", "_turn_ended_at")
+
+    def __init__(self, origin: float = None):
+        self.origin = time.monotonic() if origin is None else origin
+        self.marks = {"webhook_received": self.origin}
+        self.turns = []
+        self._turn_ended_at = None
+
+    def mark(self, milestone: str, now: float = None):
+        """Record `milestone` the first time it is reached; later calls are ignored."""
+        if milestone not in self.marks:
+            self.marks[milestone] = time.monotonic() if now is None else now
+
+    def user_turn_ended(self, now: float = None):
+        """The caller stopped speaking; the next agent frame closes the turn."""
+        if self._turn_ended_at is None:
+            self._turn_ended_at = time.monotonic() if now is None else now
+
+    def agent_audio(self, now: float = None):
+        """Call for every agent frame sent to Twilio. Cheap unless a turn is open."""
+        if self._turn_ended_at is None:
+            return
+        latency = (time.monotonic() if now is None else now) - self._turn_ended_at
+        self._turn_ended_at = None
+        self.turns.append(latency)
+        _turn_latency.observe(latency)
+
+    def finish(self) -> dict:
+        """Fold milestones into the histograms and return the timeline in milliseconds."""
+        milestones = {}
+        for name in MILESTONES:
+            at = self.marks.get(name)
+            if at is not None:
+                offset = at - self.origin
+                _milestone_hists[name].observe(offset)
+                milestones[name] = round(offset * 1000)
+        turns = sorted(self.turns)
+        return {
+            "milestones_ms": milestones,
+            "turns": len(turns),
+            "turn_p50_ms": round(turns[len(turns) // 2] * 1000) if turns else None,
+            "turn_max_ms": round(turns[-1] * 1000) if turns else None,
+            "turns_ms": [round(t * 1000) for t in self.turns],
+        }
@@ -0,0 +1,111 @@
+"""
+Per-call capture of media-stream WebSocket traffic, for offline replay.
+
+A capture file is MAGIC, a length-prefixed JSON header (call and stream
+SIDs, wall-clock start), then one record per message:
+
+    <u64 offset µs> <u8 source << 2 | kind> <u32 length> <payload>
+
+Twilio `media` events are stored as their raw µ-law payload (MEDIA) rather
+than JSON, which halves the size of a call; everything else is stored as
+sent (TEXT or BINARY). Records are buffered on the event loop and appended
+to the file by a single background thread, so capture never blocks a call.
+"""
+import json
+import time
+import struct
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from app.core.log import get_logger
+
+logger = get_logger(__name__)
+
+MAGIC = b"GCAP\x01"
+_META_LEN = struct.Struct("<I")
+_RECORD = struct.Struct("<QBI")
+
+# Sources
+TWILIO_IN, TWILIO_OUT, ULTRAVOX_IN, ULTRAVOX_OUT = range(4)
+SOURCE_NAMES = ("twilio_in", "twilio_out", "ultravox_in", "ultravox_out")
+# Kinds
+TEXT, BINARY, MEDIA = range(3)
+
+FLUSH_BYTES = 64 * 1024
+
+# One thread for all captures keeps each file's appends in order
+_io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="capture")
+
+
+def _append(path: str, chunk: bytes, create: bool):
+    try:
+        with open(path, "wb" if create else "ab") as f:
+            f.write(chunk)
+    except OSError as e:
+        logger.error("❌ Capture write to %s failed: %s", path, e)
+
+
+class CaptureWriter:
+    """Records one call's WebSocket messages with their offset from the start of the capture."""
+
+    __slots__ = ("path", "_origin", "_buf", "_last_write")
+
+    def __init__(self, path: str, meta: dict):
+        self.path = path
+        self._origin = time.monotonic()
+        header = json.dumps(meta).encode()
+        self._buf = bytearray(MAGIC + _META_LEN.pack(len(header)) + header)
+        self._last_write = None
+
+    def _record(self, source: int, kind: int, data):
+        buf = self._buf
+        buf += _RECORD.pack(int((time.monotonic() - self._origin) * 1e6), source << 2 | kind, len(data))
+        buf += data
+        if len(buf) >= FLUSH_BYTES:
+            self._flush()
+
+    def text(self, source: int, message: str):
+        self._record(source, TEXT, message.encode())
+
+    def binary(self, source: int, data):
+        self._record(source, BINARY, data)
+
+    def media(self, source: int, ulaw):
+        """A Twilio `media` event, by its decoded µ-law payload."""
+        self._record(source, MEDIA, ulaw)
+
+    def _flush(self):
+        if not self._buf:
+            return
+        chunk = bytes(self._buf)
+        self._buf.clear()
+        create = self._last_write is None
+        self._last_write = asyncio.get_running_loop().run_in_executor(_io, _append, self.path, chunk, create)
+
+    async def close(self):
+        """Write out what is buffered and wait until it is on disk."""
+        self._flush()
+        if self._last_write is not None:
+            await self._last_write
+
+
+def read_capture(path: str):
+    """Return (header, records) of a capture file; records are (offset_s, source, kind, payload) tuples."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not a media capture")
+    pos = len(MAGIC)
+    (header_len,) = _META_LEN.unpack_from(data, pos)
+    pos += _META_LEN.size
+    header = json.loads(data[pos:pos + header_len])
+    pos += header_len
+    records = []
+    while pos + _RECORD.size <= len(data):
+        offset_us, tag, length = _RECORD.unpack_from(data, pos)
+        pos += _RECORD.size
+        payload = data[pos:pos + length]
+        pos += length
+        if len(payload) < length:
+            break  # truncated tail of a capture that was still being written
+        records.append((offset_us / 1e6, tag >> 2, tag & 3, payload))
+    return header, records
@@ -0,0 +1,90 @@
+"""
+Circuit breaker for calls to a flaky upstream.
+"""
+import time
+from app.core.metrics import counter, gauge
+from app.core.log import get_logger
+
+logger = get_logger(__name__)
+
+
+BREAKER_STATE = gauge("circuit_breaker_state", "Circuit state: 0 closed, 1 half-open, 2 open", ("breaker",))
+BREAKER_OPENED = counter("circuit_breaker_opened_total", "Times the circuit opened", ("breaker",))
+BREAKER_REJECTED = counter("circuit_breaker_rejected_total", "Calls rejected while the circuit was open", ("breaker",))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for
+    `reset_timeout` seconds. Then it lets a single trial call through
+    (half-open): success closes it, failure opens it again.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_started = None
+        self.state_gauge = BREAKER_STATE.labels(name)
+        self.opened = BREAKER_OPENED.labels(name)
+        self.rejected = BREAKER_REJECTED.labels(name)
+
+    def _transition(self, state: str):
+        if state != self.state:
+            logger.info("🔌 Circuit '%s': %s → %s", self.name, self.state, state)
+            self.state = state
+            self.state_gauge.set(self._STATE_VALUES[state])
+            if state == self.OPEN:
+                self.opened.inc()
+
+    def allow(self) -> bool:
+        """Whether a call may go out now. Every allowed call must be followed by record_success/record_failure."""
+        now = time.monotonic()
+        if self.state == self.OPEN:
+            if now - self._opened_at < self.reset_timeout:
+                self.rejected.inc()
+                return False
+            self._transition(self.HALF_OPEN)
+            self._trial_started = None
+        if self.state == self.HALF_OPEN:
+            # One trial at a time; a trial that never reported back (cancelled) expires
+            if self._trial_started is not None and now - self._trial_started < self.reset_timeout:
+                self.rejected.inc()
+                return False
+            self._trial_started = now
+        return True
+
+    def check(self):
+        """Raise CircuitOpenError unless a call may go out now."""
+        if not self.allow():
+            raise CircuitOpenError(f"Circuit '{self.name}' is open")
+
+    def record_success(self):
+        self.failures = 0
+        self._trial_started = None
+        self._transition(self.CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_started = None
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+            self._transition(self.OPEN)
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "opened": self.opened.value,
+            "rejected": self.rejected.value,
+        }
@@ -0,0 +1,109 @@
+"""
+Bounded queue joining a WebSocket reader task to its writer task.
+"""
+import asyncio
+from collections import deque
+
+
+class FrameQueue:
+    """
+    FIFO between the task reading one peer and the task writing to the other.
+
+    Audio frames are droppable: once `maxsize` of them are queued the oldest
+    one is discarded, so a slow peer costs dropped audio instead of ever
+    growing latency. Control messages (JSON events, tool results) are never
+    dropped and do not count against `maxsize`.
+
+    `get()` returns None once the queue is closed and drained.
+    """
+
+    __slots__ = ("name", "maxsize", "_items", "_audio", "_waiter", "_closed",
+                 "enqueued", "dropped", "high_water")
+
+    def __init__(self, name: str, maxsize: int):
+        self.name = name
+        self.maxsize = max(1, maxsize)
+        self._items = deque()
+        self._audio = 0
+        self._waiter = None
+        self._closed = False
+        self.enqueued = 0
+        self.dropped = 0
+        self.high_water = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def _wake(self):
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def put_audio(self, frame):
+        """Queue an audio frame, dropping the oldest queued audio frame if full."""
+        if self._closed:
+            return
+        if self._audio >= self.maxsize:
+            self._drop_oldest_audio()
+        self._items.append((True, frame))
+        self._audio += 1
+        self.enqueued += 1
+        if self._audio > self.high_water:
+            self.high_water = self._audio
+        self._wake()
+
+    def put_control(self, message):
+        """Queue a message that must be delivered."""
+        if self._closed:
+            return
+        self._items.append((False, message))
+        self.enqueued += 1
+        self._wake()
+
+    def _drop_oldest_audio(self):
+        items = self._items
+        if items[0][0]:
+            items.popleft()
+        else:
+            for i, (is_audio, _) in enumerate(items):
+                if is_audio:
+                    del items[i]
+                    break
+        self._audio -= 1
+        self.dropped += 1
+
+    def clear_audio(self) -> int:
+        """Discard every queued audio frame, keeping control messages. Returns the count."""
+        cleared = self._audio
+        if cleared:
+            self._items = deque(item for item in self._items if not item[0])
+            self._audio = 0
+        return cleared
+
+    async def get(self):
+        while not self._items:
+            if self._closed:
+                return None
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        is_audio, item = self._items.popleft()
+        if is_audio:
+            self._audio -= 1
+        return item
+
+    def close(self):
+        """Stop accepting items; the writer drains what is queued, then gets None."""
+        self._closed = True
+        self._wake()
+
+    def stats(self) -> dict:
+        return {
+            "depth": len(self._items),
+            "maxsize": self.maxsize,
+            "high_water": self.high_water,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+        }
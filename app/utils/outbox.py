@@ -0,0 +1,178 @@
+"""
+Durable outbox: payloads are appended to a local SQLite table and delivered
+by a background worker, so callers never wait on the remote end.
+
+Rows stay in the table until delivered, so anything still pending when the
+process stops is replayed by the worker on the next start. Failed deliveries
+are retried with capped exponential backoff and jitter; after `max_attempts`
+a row is kept but marked dead and no longer retried.
+"""
+import json
+import time
+import random
+import asyncio
+import sqlite3
+from app.core.metrics import counter
+from app.core.log import get_logger
+
+logger = get_logger(__name__)
+
+OUTBOX_DELIVERED = counter("outbox_delivered_total", "Payloads delivered", ("outbox",))
+OUTBOX_RETRIED = counter("outbox_retried_total", "Failed delivery attempts scheduled for retry", ("outbox",))
+OUTBOX_DEAD = counter("outbox_dead_total", "Payloads given up on after max attempts", ("outbox",))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    dead INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+
+class Outbox:
+    """SQLite-backed queue of JSON payloads with a concurrency-limited delivery worker."""
+
+    def __init__(self, name: str, path: str, deliver, concurrency: int = 4, max_attempts: int = 8,
+                 backoff_base: float = 1.0, backoff_max: float = 300.0):
+        """`deliver` is an `async def deliver(payload)` that raises on failure."""
+        self.name = name
+        self.path = path
+        self.deliver = deliver
+        self.concurrency = max(1, concurrency)
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.delivered = OUTBOX_DELIVERED.labels(name)
+        self.retried = OUTBOX_RETRIED.labels(name)
+        self.dead = OUTBOX_DEAD.labels(name)
+        self._db = None
+        self._task = None
+        self._wake = None
+        self._slots = None
+        self._inflight = set()
+
+    def _connect(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(_SCHEMA)
+        return self._db
+
+    def enqueue(self, payload: dict) -> int:
+        """Append `payload` for delivery and return its row id. Constant time; never waits on the network."""
+        now = time.time()
+        row_id = self._connect().execute(
+            "INSERT INTO outbox (payload, created_at, next_attempt_at) VALUES (?, ?, ?)",
+            (json.dumps(payload), now, now),
+        ).lastrowid
+        if self._wake is not None:
+            self._wake.set()
+        return row_id
+
+    def pending(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM outbox WHERE dead = 0").fetchone()[0]
+
+    def start(self):
+        """Start the delivery worker; rows left over from a previous run are replayed."""
+        if self._task is not None:
+            return
+        self._connect()
+        self._wake = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        pending = self.pending()
+        if pending:
+            logger.info("📬 Outbox '%s': replaying %s undelivered payload(s)", self.name, pending)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the worker. Deliveries still in flight are retried on the next start."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    async def _run(self):
+        workers = set()
+        try:
+            while True:
+                self._wake.clear()
+                now = time.time()
+                rows = self._db.execute(
+                    "SELECT id, payload, attempts FROM outbox WHERE dead = 0 AND next_attempt_at <= ? "
+                    "ORDER BY id LIMIT ?",
+                    (now, self.concurrency * 4),
+                ).fetchall()
+                dispatched = 0
+                for row_id, payload, attempts in rows:
+                    if row_id in self._inflight:
+                        continue
+                    await self._slots.acquire()
+                    self._inflight.add(row_id)
+                    worker = asyncio.create_task(self._deliver_one(row_id, json.loads(payload), attempts))
+                    workers.add(worker)
+                    worker.add_done_callback(workers.discard)
+                    dispatched += 1
+                if dispatched and len(rows) == self.concurrency * 4:
+                    continue
+
+                next_due = self._db.execute(
+                    "SELECT MIN(next_attempt_at) FROM outbox WHERE dead = 0 AND next_attempt_at > ?", (now,)
+                ).fetchone()[0]
+                timeout = None if next_due is None else max(0.0, next_due - time.time())
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    async def _deliver_one(self, row_id: int, payload: dict, attempts: int):
+        try:
+            await self.deliver(payload)
+            self._db.execute("DELETE FROM outbox WHERE id = ?", (row_id,))
+            self.delivered.inc()
+        except Exception as e:
+            attempts += 1
+            if attempts >= self.max_attempts:
+                self._db.execute(
+                    "UPDATE outbox SET attempts = ?, last_error = ?, dead = 1 WHERE id = ?",
+                    (attempts, str(e), row_id),
+                )
+                self.dead.inc()
+                logger.error("💀 Outbox '%s': giving up on payload %s after %s attempts: %s", self.name, row_id, attempts, e)
+            else:
+                # Capped exponential backoff with jitter over the upper half of the window
+                window = min(self.backoff_max, self.backoff_base * 2 ** attempts)
+                delay = window / 2 + random.uniform(0, window / 2)
+                self._db.execute(
+                    "UPDATE outbox SET attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?",
+                    (attempts, str(e), time.time() + delay, row_id),
+                )
+                self.retried.inc()
+                logger.warning("⏳ Outbox '%s': payload %s failed (%s); retry %s in %.1fs", self.name, row_id, e, attempts, delay)
+        finally:
+            self._inflight.discard(row_id)
+            self._slots.release()
+            self._wake.set()
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending() if self._db is not None else None,
+            "inflight": len(self._inflight),
+            "delivered": self.delivered.value,
+            "retried": self.retried.value,
+            "dead": self.dead.value,
+        }
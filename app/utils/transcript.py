@@ -0,0 +1,85 @@
+"""
+Per-call transcript assembled from Ultravox transcript messages.
+"""
+import time
+
+
+class Segment:
+    """One finalized utterance; times are seconds since the transcript started."""
+
+    __slots__ = ("ordinal", "role", "text", "started_at", "ended_at")
+
+    def __init__(self, ordinal, role: str, text: str, started_at: float, ended_at: float):
+        self.ordinal = ordinal
+        self.role = role
+        self.text = text
+        self.started_at = started_at
+        self.ended_at = ended_at
+
+    def __repr__(self):
+        return f"<Segment {self.ordinal} {self.role} {self.started_at:.1f}-{self.ended_at:.1f}s {self.text!r}>"
+
+
+class Transcript:
+    """
+    Merges streaming transcript messages into one entry per utterance.
+
+    Ultravox sends either the full text so far (`text`) or an increment
+    (`delta`) for an utterance, identified by its `ordinal`, and marks the
+    last message `final`. Deltas are collected per utterance and joined once
+    when it is finalized, so each turn ends up as a single string in
+    `segments`. The flat text is rendered on demand, normally once at the end
+    of the call.
+    """
+
+    __slots__ = ("segments", "_open", "_started")
+
+    def __init__(self):
+        self.segments = []
+        self._open = {}  # ordinal (or role if absent) -> [role, parts, started_at]
+        self._started = time.monotonic()
+
+    def __len__(self):
+        return len(self.segments)
+
+    def update(self, role: str, text: str = None, delta: str = None, final: bool = False, ordinal=None):
+        """Apply one transcript message; returns the Segment if this message finalized it."""
+        key = ordinal if ordinal is not None else role
+        entry = self._open.get(key)
+        if entry is None:
+            entry = self._open[key] = [role, [], time.monotonic() - self._started]
+        if text is not None:
+            entry[1] = [text]
+        elif delta:
+            entry[1].append(delta)
+
+        if not final:
+            return None
+        del self._open[key]
+        full_text = "".join(entry[1]).strip()
+        if not full_text:
+            return None
+        segment = Segment(ordinal, role, full_text, entry[2], time.monotonic() - self._started)
+        self.segments.append(segment)
+        return segment
+
+    def flush(self) -> list:
+        """Finalize the utterances still in progress (the call is ending); returns their Segments."""
+        ended_at = time.monotonic() - self._started
+        flushed = []
+        for key, (role, parts, started_at) in sorted(self._open.items(), key=lambda item: item[1][2]):
+            text = "".join(parts).strip()
+            if text:
+                flushed.append(Segment(None if key == role else key, role, text, started_at, ended_at))
+        self._open.clear()
+        self.segments.extend(flushed)
+        return flushed
+
+    def render(self) -> str:
+        """Flat "Role: text" lines, including utterances still in progress."""
+        lines = [f"{s.role.capitalize()}: {s.text}\n" for s in self.segments]
+        for role, parts, _ in self._open.values():
+            pending = "".join(parts).strip()
+            if pending:
+                lines.append(f"{role.capitalize()}: {pending}\n")
+        return "".join(lines)
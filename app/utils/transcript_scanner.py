@@ -0,0 +1,32 @@
+"""
+Single-pass scanner for intents and entities in finalized transcript text.
+
+All phrases are alternatives of one compiled regex, so each utterance is
+scanned once, when it is finalized, whatever the number of patterns.
+"""
+import re
+
+_PATTERN = re.compile(
+    r"""
+      (?P<name>\b(?:my\ name\ is|this\ is|i['’]m|i\ am)\b)
+    | (?P<email>[\w.+-]+@[\w-]+(?:\.[\w-]+)+)
+    | (?P<book>\bbook\w*)
+    | (?P<appointment>\bappointment\w*)
+    | (?P<dock_tour>\bdock\ tours?\b)
+    | (?P<confirmation_email>\bconfirmation\ emails?\b)
+    """,
+    re.IGNORECASE | re.VERBOSE,
+)
+
+# Route 3 (booked dock tour) once both phrases have come up anywhere in the call
+DOCK_TOUR_BOOKED = frozenset(("dock_tour", "confirmation_email"))
+
+
+def scan(text: str) -> dict:
+    """Return {pattern name: first matched text} for every pattern found in `text`."""
+    hits = {}
+    for match in _PATTERN.finditer(text):
+        kind = match.lastgroup
+        if kind not in hits:
+            hits[kind] = match.group()
+    return hits
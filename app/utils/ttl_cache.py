@@ -0,0 +1,63 @@
+"""
+Small in-process LRU cache with time-to-live and stale-while-revalidate.
+"""
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    LRU cache bounded to `maxsize` entries.
+
+    An entry is fresh for `ttl` seconds after it is stored. For `stale_ttl`
+    seconds after that it is still returned, flagged as stale, so the caller
+    can serve it immediately and refresh it in the background. Older entries
+    are treated as missing.
+    """
+
+    __slots__ = ("maxsize", "ttl", "stale_ttl", "_data", "hits", "stale_hits", "misses")
+
+    def __init__(self, maxsize: int, ttl: float, stale_ttl: float = 0.0):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._data = OrderedDict()  # key -> (value, stored_at)
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        """Return (value, is_fresh); (None, False) on a miss."""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None, False
+        value, stored_at = entry
+        age = time.monotonic() - stored_at
+        if age > self.ttl + self.stale_ttl:
+            del self._data[key]
+            self.misses += 1
+            return None, False
+        self._data.move_to_end(key)
+        if age > self.ttl:
+            self.stale_hits += 1
+            return value, False
+        self.hits += 1
+        return value, True
+
+    def set(self, key, value):
+        self._data[key] = (value, time.monotonic())
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+        }
@@ -3,19 +3,22 @@ Utility functions for WebSocket management.
 """
 import asyncio
 import websockets
+from app.core.log import get_logger
+
+logger = get_logger(__name__)
 
 
 async def safe_close_websocket(ws, name="WebSocket", timeout=3.0):
     """Safely close a WebSocket with timeout handling and error management."""
     if not ws or not hasattr(ws, 'state'):
-        print(f"{name} is not valid or already closed")
+        logger.debug("%s is not valid or already closed", name)
         return
         
     if ws.state != websockets.protocol.State.OPEN:
-        print(f"{name} is not in OPEN state, current state: {ws.state}")
+        logger.debug("%s is not in OPEN state, current state: %s", name, ws.state)
         return
         
-    print(f"Attempting to safely close {name}...")
+    logger.debug("Attempting to safely close %s...", name)
     
     try:
         # Set shorter timeouts before closing if possible
@@ -27,17 +30,17 @@ async def safe_close_websocket(ws, name="WebSocket", timeout=3.0):
         # Close with timeout
         try:
             await asyncio.wait_for(ws.close(), timeout=timeout)
-            print(f"{name} closed successfully")
+            logger.info("%s closed successfully", name)
         except asyncio.TimeoutError:
             # print(f"Timeout while closing {name}, forcing cleanup")
             # Force the connection to be considered closed if possible
             if hasattr(ws, '_close_connection'):
                 ws._close_connection()
     except Exception as e:
-        print(f"Error closing {name}: {e}")
+        logger.warning("Error closing %s: %s", name, e)
         if hasattr(ws, '_close_connection'):
             try:
                 ws._close_connection()
-                print(f"Forced {name} closure after error")
+                logger.info("Forced %s closure after error", name)
             except Exception as forced_error:
-                print(f"Even forced {name} closure failed: {forced_error}")
+                logger.error("Even forced %s closure failed: %s", name, forced_error)
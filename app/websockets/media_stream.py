@@ -1,26 +1,71 @@
 """
 WebSocket handlers for Twilio and Ultravox media streaming.
 """
+import os
 import json
+import logging
+import time
 import uuid
 import asyncio
-import audioop
 import base64
-import traceback
 import websockets
 from datetime import datetime
 from fastapi import WebSocket, WebSocketDisconnect
 from app.utils.websocket_utils import safe_close_websocket
-from app.core.config import LOG_EVENT_TYPES
+from app.audio.codec import FRAME_MS, MuLawTranscoder
+from app.websockets.twilio_frames import MediaFrameEncoder, extract_media_payload
+from app.utils.frame_queue import FrameQueue
+from app.audio.playout import OutboundPlayout
+from app.utils.transcript_scanner import scan as scan_transcript, DOCK_TOUR_BOOKED
+from app.utils.capture import CaptureWriter, TWILIO_IN, TWILIO_OUT, ULTRAVOX_IN, ULTRAVOX_OUT
+from app.core.config import (
+    LOG_EVENT_TYPES,
+    TWILIO_QUEUE_DEPTH,
+    ULTRAVOX_QUEUE_DEPTH,
+    TWILIO_PLAYOUT_BUFFER_MS,
+    TWILIO_PLAYOUT_LEAD_MS,
+    TWILIO_MARK_INTERVAL_MS,
+    MEDIA_CAPTURE_DIR,
+)
 from app.services.n8n_service import send_transcript_to_n8n
-from app.services.ultravox_service import create_ultravox_call
+from app.services.ultravox_service import create_ultravox_call, ULTRAVOX_LATENCY
+from app.services.tool_runner import ToolRunner
 from app.core.prompts import SYSTEM_MESSAGE
 from app.core.shared_state import sessions
+from app.core.metrics import counter, gauge, histogram, on_collect
 from fastapi import APIRouter
 from app.services.n8n_service import send_action_to_n8n
+from app.core.log import get_logger, log_payload, set_call_context
+
+logger = get_logger(__name__)
 
 router = APIRouter()
 
+WRITER_DRAIN_TIMEOUT = 0.5  # seconds teardown waits for the writers to empty their queues
+
+CODEC_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01)
+MEDIA_STREAMS = gauge("media_streams_active", "Open Twilio media-stream WebSockets")
+MEDIA_FRAMES = counter("media_frames_total", "20 ms µ-law frames received from (inbound) and sent to (outbound) Twilio", ("direction",))
+CODEC_SECONDS = histogram("codec_seconds", "Transcoding time per inbound frame (decode) or Ultravox audio chunk (encode)", ("op",), CODEC_BUCKETS)
+QUEUE_DEPTH = gauge("frame_queue_depth", "Messages waiting in the per-call peer queues, summed over live calls", ("queue",))
+
+# Bound once: these are updated per audio frame
+_streams_active = MEDIA_STREAMS.labels()
+_frames_in = MEDIA_FRAMES.labels("inbound")
+_frames_out = MEDIA_FRAMES.labels("outbound")
+_decode_time = CODEC_SECONDS.labels("decode")
+_encode_time = CODEC_SECONDS.labels("encode")
+
+
+@on_collect
+def _collect_queue_depths():
+    depths = {"to_twilio": 0, "to_ultravox": 0}
+    for session in sessions:
+        for name, queue in session.queues.items():
+            depths[name] = depths.get(name, 0) + len(queue)
+    for name, depth in depths.items():
+        QUEUE_DEPTH.labels(name).set(depth)
+
 @router.websocket("/media-stream")
 async def media_stream(websocket: WebSocket):
     """
@@ -28,109 +73,219 @@ async def media_stream(websocket: WebSocket):
     Includes transcoding audio between Twilio's G.711 µ-law and Ultravox's s16 PCM.
     """
     await websocket.accept()
-    print('🟢 Client connected to /media-stream (Twilio)')
+    _streams_active.inc()
+    try:
+        await _run_media_stream(websocket)
+    finally:
+        _streams_active.dec()
+
+
+async def _run_media_stream(websocket: WebSocket):
+    """One accepted media stream, from the Twilio 'start' event to teardown."""
+    logger.info("🟢 Client connected to /media-stream (Twilio)")
 
     call_sid = None
     session = None
     stream_sid = ''
     uv_ws = None
     twilio_task = None
+    writer_tasks = []
+    action_tasks = set()  # route 3 posts in flight; cancelled at teardown like tool calls
+    tool_runner = None
     twilio_ws_active = True
     ultravox_ws_active = False
+    # One transcoder per direction: each reuses its output buffer frame to frame
+    inbound_codec = MuLawTranscoder()
+    outbound_codec = MuLawTranscoder()
+    media_encoder = None
+    timeline = None
+    capture = None  # CaptureWriter when MEDIA_CAPTURE_DIR is set
+    first_audio_sent = False
+    # Each reader hands frames to the opposite peer's writer task through a bounded queue,
+    # so a slow peer drops old audio instead of stalling the other side's reading loop
+    to_twilio = FrameQueue("to_twilio", TWILIO_QUEUE_DEPTH)
+    to_ultravox = FrameQueue("to_ultravox", ULTRAVOX_QUEUE_DEPTH)
+    # Agent audio is re-framed to 20 ms µ-law and paced into to_twilio in real time
+    playout = OutboundPlayout(
+        outbound_codec,
+        capacity_ms=TWILIO_PLAYOUT_BUFFER_MS,
+        lead_ms=TWILIO_PLAYOUT_LEAD_MS,
+        mark_interval_ms=TWILIO_MARK_INTERVAL_MS,
+    )
+
+    def send_frame(ulaw):
+        nonlocal first_audio_sent
+        to_twilio.put_audio(media_encoder.render(ulaw))
+        _frames_out.inc()
+        if capture is not None:
+            capture.media(TWILIO_OUT, ulaw)
+        timeline.agent_audio()
+        if not first_audio_sent:
+            first_audio_sent = True
+            timeline.mark("first_agent_audio")
+            if session and session.webhook_received_at:
+                elapsed_ms = (time.monotonic() - session.webhook_received_at) * 1000
+                logger.info("⏱️ Time to first audio: %.0f ms after /incoming-call (CallSid=%s)", elapsed_ms, call_sid)
+
+    def send_mark(name):
+        message = media_encoder.render_mark(name)
+        to_twilio.put_control(message)
+        if capture is not None:
+            capture.text(TWILIO_OUT, message)
+
+    def send_clear():
+        message = media_encoder.render_clear()
+        to_twilio.put_control(message)
+        if capture is not None:
+            capture.text(TWILIO_OUT, message)
+
+    async def send_to_ultravox(message):
+        to_ultravox.put_control(message)
+
+    async def write_twilio():
+        nonlocal twilio_ws_active
+        try:
+            while True:
+                item = await to_twilio.get()
+                if item is None:
+                    break
+                await websocket.send_text(item)
+        except Exception as e:
+            logger.error("❌ Error sending to Twilio: %s", e)
+            twilio_ws_active = False
+
+    async def write_ultravox():
+        nonlocal ultravox_ws_active
+        try:
+            while True:
+                item = await to_ultravox.get()
+                if item is None:
+                    break
+                if isinstance(item, bytes):
+                    try:
+                        started = time.perf_counter()
+                        item = inbound_codec.decode(item)
+                        _decode_time.observe(time.perf_counter() - started)
+                    except Exception as e:
+                        logger.error("❌ Error transcoding µ-law to PCM: %s", e)
+                        continue
+                if capture is not None:
+                    if isinstance(item, str):
+                        capture.text(ULTRAVOX_OUT, item)
+                    else:
+                        capture.binary(ULTRAVOX_OUT, item)
+                await uv_ws.send(item)
+        except Exception as e:
+            logger.error("❌ Error sending to Ultravox: %s", e)
+            ultravox_ws_active = False
+
+    async def send_booking(extra_data):
+        try:
+            await send_action_to_n8n(
+                action="book_call",
+                session_id=call_sid,
+                caller_number=session.caller_number,
+                extra_data=extra_data
+            )
+            logger.info("✅ Realtime booking data sent.")
+        except Exception as e:
+            logger.error("❌ Realtime booking send failed: %s", e)
+            session.realtime_payload_sent = False  # the transcript goes to n8n at teardown instead
+
+    def route_from_transcript():
+        # A call that covered a dock tour and its confirmation email is a booking (route 3)
+        if DOCK_TOUR_BOOKED <= session.signals:
+            session.route = 3
+            logger.info("🧭 Route set to 3 based on transcript content")
 
     async def handle_ultravox():
-        printed_name = None
-        printed_email = None
         nonlocal uv_ws, session, stream_sid, call_sid, twilio_task, twilio_ws_active, ultravox_ws_active
         try:
             uv_ws.ping_timeout = 10.0
             uv_ws.close_timeout = 5.0
 
             async for raw_message in uv_ws:
-                if session and session.get('hanging_up', False):
-                    print("🔴 Ultravox session marked for hangup. Exiting...")
+                if capture is not None:
+                    if isinstance(raw_message, bytes):
+                        capture.binary(ULTRAVOX_IN, raw_message)
+                    else:
+                        capture.text(ULTRAVOX_IN, raw_message)
+
+                if session and session.hanging_up:
+                    logger.info("🔴 Ultravox session marked for hangup. Exiting...")
                     break
 
                 if isinstance(raw_message, bytes):
-                    try:
-                        mu_law_bytes = audioop.lin2ulaw(raw_message, 2)
-                        payload_base64 = base64.b64encode(mu_law_bytes).decode('ascii')
-                        if twilio_ws_active:
-                            await websocket.send_text(json.dumps({
-                                "event": "media",
-                                "streamSid": stream_sid,
-                                "media": { "payload": payload_base64 }
-                            }))
-                    except Exception as e:
-                        print(f"❌ Audio transcoding/sending error: {e}")
-                        twilio_ws_active = False
+                    if twilio_ws_active:
+                        try:
+                            started = time.perf_counter()
+                            playout.write_pcm(raw_message)
+                            _encode_time.observe(time.perf_counter() - started)
+                        except Exception as e:
+                            logger.error("❌ Audio transcoding error: %s", e)
                     continue
 
                 try:
                     msg_data = json.loads(raw_message)
                 except Exception:
-                    print(f"❌ Invalid JSON from Ultravox: {raw_message}")
+                    logger.warning("❌ Invalid JSON from Ultravox: %s", raw_message)
                     continue
 
                 msg_type = msg_data.get("type") or msg_data.get("eventType")
 
                 if msg_type == "transcript":
                     role = msg_data.get("role")
-                    text = msg_data.get("text") or msg_data.get("delta")
-                    final = msg_data.get("final", False)
+                    if not role:
+                        continue
 
-                    if not role or not text:
+                    segment = session.transcript.update(
+                        role,
+                        text=msg_data.get("text"),
+                        delta=msg_data.get("delta"),
+                        final=msg_data.get("final", False),
+                        ordinal=msg_data.get("ordinal"),
+                    )
+                    if not segment:
                         continue
 
                     role_cap = role.capitalize()
-                    session['transcript'] += f"{role_cap}: {text}\n"
-                    lower_text = text.lower().strip()
-
-                    # Print name once
-                    if any(p in lower_text for p in ["my name is", "this is", "i'm", "i am"]):
-                        name = text.strip()
-                        if name != printed_name:
-                            session["callerName"] = name
-                            printed_name = name
-                            print("📩 Name:", name)
-
-                    # Print email once
-                    if "@" in text and "." in text:
-                        email = text.strip()
-                        if email != printed_email:
-                            session["callerEmail"] = email
-                            printed_email = email
-                            print("📧 Email:", email)
+                    emoji = "🤖" if role_cap == "Agent" else "👤"
+                    logger.info("%s %s: %s", emoji, role_cap, segment.text)
 
-                    # Trigger booking
-                    if "book" in lower_text and "appointment" in lower_text and not session.get("realtime_payload_sent"):
-                        print("📤 Booking intent detected. Sending to N8N...")
-                        await send_action_to_n8n(
-                            action="book_call",
-                            session_id=call_sid,
-                            caller_number=session.get("callerNumber"),
-                            extra_data={
-                                "data": json.dumps({
-                                    "name": session.get("callerName", "Unknown"),
-                                    "email": session.get("callerEmail", "Unknown"),
-                                    "purpose": text,
-                                    "datetime": session.get("appointmentTime"),
-                                    "calendar_id": session.get("calendar_id", "primary")
-                                })
-                            }
-                        )
-                        session["realtime_payload_sent"] = True
-                        print("✅ Realtime booking data sent.")
+                    # Each utterance is scanned once, when it is finalized
+                    hits = scan_transcript(segment.text)
+                    if not hits:
+                        continue
+                    session.signals.update(hits)
 
-                    if final:
-                        emoji = "🤖" if role_cap == "Agent" else "👤"
-                        print(f"{emoji} {role_cap}: {text.strip()}")
+                    if role == "user":
+                        if "name" in hits and segment.text != session.caller_name:
+                            session.caller_name = segment.text
+                            logger.info("📩 Name: %s", segment.text)
+                        if "email" in hits and hits["email"] != session.caller_email:
+                            session.caller_email = hits["email"]
+                            logger.info("📧 Email: %s", hits["email"])
+
+                    # Trigger booking
+                    if "book" in hits and "appointment" in hits and not session.realtime_payload_sent:
+                        logger.info("📤 Booking intent detected. Sending to N8N...")
+                        session.realtime_payload_sent = True
+                        # The reply is only logged, so the POST (and its retries) must not hold up this loop
+                        action_task = asyncio.create_task(send_booking({
+                            "data": json.dumps({
+                                "name": session.caller_name or "Unknown",
+                                "email": session.caller_email or "Unknown",
+                                "purpose": segment.text,
+                                "datetime": session.appointment_time,
+                                "calendar_id": session.calendar_id
+                            })
+                        }))
+                        action_tasks.add(action_task)
+                        action_task.add_done_callback(action_tasks.discard)
 
                 elif msg_type == "client_tool_invocation":
-                    print(f"🛠️ Tool invoked: {msg_data.get('toolName')} ({msg_data.get('invocationId')})")
-                    from app.services.tools_service import handle_tool_invocation
-                    await handle_tool_invocation(
-                        uv_ws,
+                    logger.info("🛠️ Tool invoked: %s (%s)", msg_data.get('toolName'), msg_data.get('invocationId'))
+                    tool_runner.submit(
                         msg_data.get("toolName", ""),
                         msg_data.get("invocationId"),
                         msg_data.get("parameters", {})
@@ -138,189 +293,266 @@ async def media_stream(websocket: WebSocket):
 
                 elif msg_type == "state":
                     state = msg_data.get("state")
-                    print(f"🔄 Agent state: {state}")
+                    logger.info("🔄 Agent state: %s", state)
+                    if state == "thinking":
+                        # The caller has finished speaking; the turn ends at the next agent frame
+                        timeline.user_turn_ended()
                     if state == "ready":
                         invocation_id = str(uuid.uuid4())
-                        print("🚀 Agent ready. Checking returning user...")
-                        await uv_ws.send(json.dumps({
+                        logger.info("🚀 Agent ready. Checking returning user...")
+                        to_ultravox.put_control(json.dumps({
                             "type": "client_tool_invocation",
                             "toolName": "check_returning_user",
                             "invocationId": invocation_id,
                             "parameters": {
-                                "caller_number": session.get("callerNumber", "Unknown")
+                                "caller_number": session.caller_number
                             }
                         }))
 
                 elif msg_type == "debug":
                     debug_message = msg_data.get("message")
-                    print(f"🐛 Debug: {debug_message}")
-                    try:
-                        nested = json.loads(debug_message)
-                        if nested.get("type") == "toolResult":
-                            print(f"✅ Tool '{nested.get('toolName')}' result:", json.dumps(nested.get("output"), indent=2))
-                    except json.JSONDecodeError:
-                        print(f"⚠️ Couldn't parse debug: {debug_message}")
+                    logger.debug("🐛 Debug: %s", debug_message)
+                    if logger.isEnabledFor(logging.DEBUG):
+                        try:
+                            nested = json.loads(debug_message)
+                            if nested.get("type") == "toolResult":
+                                log_payload(logger, f"✅ Tool '{nested.get('toolName')}' result", nested.get("output"))
+                        except json.JSONDecodeError:
+                            logger.debug("⚠️ Couldn't parse debug: %s", debug_message)
+
+                elif msg_type == "playback_clear_buffer":
+                    # Caller barged in: drop agent audio queued here and buffered at Twilio
+                    if media_encoder:
+                        flushed_ms = to_twilio.clear_audio() * FRAME_MS + playout.interrupt(send_mark, send_clear)
+                        logger.info("✋ Barge-in: flushed %s ms of queued agent audio, clear sent to Twilio", flushed_ms)
 
                 elif msg_type in LOG_EVENT_TYPES:
-                    print(f"📣 Ultravox event: {msg_type} - {msg_data}")
+                    logger.info("📣 Ultravox event: %s - %s", msg_type, msg_data)
 
-                elif msg_type != "playback_clear_buffer":
-                    print(f"❓ Unknown message type: {msg_type} - {msg_data}")
+                else:
+                    logger.debug("❓ Unknown message type: %s - %s", msg_type, msg_data)
 
         except websockets.exceptions.ConnectionClosedError as e:
-            print(f"🔌 Ultravox WebSocket closed unexpectedly: {e}")
+            logger.warning("🔌 Ultravox WebSocket closed unexpectedly: %s", e)
         except websockets.exceptions.ConnectionClosedOK as e:
-            print(f"🔚 Ultravox WebSocket closed normally: {e}")
+            logger.info("🔚 Ultravox WebSocket closed normally: %s", e)
         except Exception as e:
-            print(f"❌ Unhandled error in handle_ultravox: {e}")
-            traceback.print_exc()
+            logger.exception("❌ Unhandled error in handle_ultravox: %s", e)
         finally:
             ultravox_ws_active = False
             if session:
-                session['ultravox_ws_active'] = False
+                session.ultravox_ws_active = False
 
 
     # Define handler for Twilio messages
     async def handle_twilio():
-        nonlocal call_sid, session, stream_sid, uv_ws, twilio_ws_active, ultravox_ws_active
+        nonlocal call_sid, session, stream_sid, uv_ws, twilio_ws_active, ultravox_ws_active, media_encoder, tool_runner, timeline, capture
         try:
             while True:
                 message = await websocket.receive_text()
-                data = json.loads(message)
 
-                if data.get('event') == 'start':
-                    print("🔔 Twilio 'start' event received")
+                # Fast path: media frames are sliced out of the raw text without json.loads
+                mu_law_bytes = extract_media_payload(message)
+                if mu_law_bytes is None:
+                    data = json.loads(message)
+                    event = data.get('event')
+                    if event == 'media':
+                        try:
+                            mu_law_bytes = base64.b64decode(data['media']['payload'])
+                        except Exception as e:
+                            logger.error("❌ Error decoding base64: %s", e)
+                            continue
+                else:
+                    event = 'media'
+
+                if capture is not None:
+                    if event == 'media':
+                        capture.media(TWILIO_IN, mu_law_bytes)
+                    else:
+                        capture.text(TWILIO_IN, message)
+
+                if session:
+                    now = time.monotonic()
+                    if now - session.last_activity >= 1.0:
+                        sessions.touch(session, now)
+
+                if event == 'start':
+                    logger.info("🔔 Twilio 'start' event received")
                     stream_sid = data['start']['streamSid']
                     call_sid = data['start']['callSid']
+                    media_encoder = MediaFrameEncoder(stream_sid)
                     custom_parameters = data['start'].get('customParameters', {})
-                    print(f"CallSid: {call_sid}, StreamSid: {stream_sid}")
+                    set_call_context(call_sid, stream_sid)
+                    logger.info("CallSid: %s, StreamSid: %s", call_sid, stream_sid)
 
                     raw_first_message = custom_parameters.get('firstMessage', "Hello, how can I assist you?")
                     first_message = raw_first_message['message']['content'] if isinstance(raw_first_message, dict) and 'message' in raw_first_message else str(raw_first_message)
                     caller_number = custom_parameters.get('callerNumber', 'Unknown')
 
-                    if call_sid and call_sid in sessions:
-                        session = sessions[call_sid]
-                        session['callerNumber'] = caller_number
-                        session['streamSid'] = stream_sid
-                        session['transcript'] = ""
+                    session = sessions.get(call_sid) if call_sid else None
+                    if session:
+                        session.caller_number = caller_number
+                        session.queues = {q.name: q for q in (to_twilio, to_ultravox)}
+                        session.playout = playout
+                        sessions.bind_stream(session, stream_sid)
+                        timeline = session.timeline
+                        timeline.mark("stream_started")
+                        if MEDIA_CAPTURE_DIR:
+                            os.makedirs(MEDIA_CAPTURE_DIR, exist_ok=True)
+                            capture = CaptureWriter(os.path.join(MEDIA_CAPTURE_DIR, f"{call_sid}.gcap"), {
+                                "call_sid": call_sid,
+                                "stream_sid": stream_sid,
+                                "started_at": datetime.now().isoformat(),
+                            })
+                            capture.text(TWILIO_IN, message)
                     else:
-                        print(f"❌ Session not found for CallSid: {call_sid}")
+                        logger.error("❌ Session not found for CallSid: %s", call_sid)
                         await websocket.close()
                         return
 
-                    print("📞 Caller Number:", caller_number)
-                    print("🗨️ First Message:", first_message)
+                    logger.info("📞 Caller Number: %s", caller_number)
+                    logger.info("🗨️ First Message: %s", first_message)
+
+                    uv_join_url = ""
+                    uv_call_task, session.uv_call_task = session.uv_call_task, None
+                    uv_call_expiry, session.uv_call_expiry = session.uv_call_expiry, None
+                    if uv_call_expiry is not None:
+                        uv_call_expiry.cancel()
+                    if uv_call_task is not None:
+                        # Pre-created at /incoming-call: usually finished or nearly so by now
+                        wait_started = time.monotonic()
+                        try:
+                            uv_join_url = await uv_call_task
+                        except asyncio.CancelledError:
+                            if not uv_call_task.cancelled():
+                                raise
+                        logger.info("🎤 Pre-created Ultravox call ready after %.0f ms wait", (time.monotonic() - wait_started) * 1000)
 
-                    from app.core.prompts import SYSTEM_MESSAGE
-                    uv_join_url = await create_ultravox_call(
-                        system_prompt=SYSTEM_MESSAGE,
-                        first_message=first_message,
-                        agent_id=caller_number,
-                        voice="Tanya-English"
-                    )
+                    if not uv_join_url:
+                        uv_join_url = await create_ultravox_call(
+                            system_prompt=SYSTEM_MESSAGE,
+                            first_message=first_message,
+                            agent_id=caller_number,
+                            voice="Tanya-English"
+                        )
+                        if uv_join_url:
+                            timeline.mark("ultravox_call_created")
 
                     if not uv_join_url:
-                        print("❌ Ultravox joinUrl is empty. Aborting call.")
+                        logger.error("❌ Ultravox joinUrl is empty. Aborting call.")
                         await websocket.close()
                         return
 
                     try:
+                        connect_started = time.perf_counter()
                         uv_ws = await websockets.connect(
                             uv_join_url,
                             ping_interval=20.0,
                             ping_timeout=10.0,
                             close_timeout=5.0
                         )
-                        print("✅ Ultravox WebSocket connected")
+                        ULTRAVOX_LATENCY.labels("ws_connect").observe(time.perf_counter() - connect_started)
+                        timeline.mark("ultravox_connected")
+                        logger.info("✅ Ultravox WebSocket connected")
 
                         ultravox_ws_active = True
-                        if call_sid and call_sid in sessions:
-                            sessions[call_sid]['uv_ws'] = uv_ws
-                            sessions[call_sid]['ultravox_ws_active'] = True
-                            sessions[call_sid]['twilio_ws_active'] = twilio_ws_active
+                        sessions.bind_uv_ws(session, uv_ws)
+                        session.ultravox_ws_active = True
+                        session.twilio_ws_active = twilio_ws_active
                     except Exception as e:
-                        print(f"❌ Failed to connect Ultravox WebSocket: {e}")
-                        traceback.print_exc()
+                        logger.exception("❌ Failed to connect Ultravox WebSocket: %s", e)
                         twilio_ws_active = False
                         await safe_close_websocket(websocket, name="Twilio WebSocket (connection failure)")
                         return
 
+                    tool_runner = ToolRunner(uv_ws, send_to_ultravox, session)
+                    writer_tasks.append(asyncio.create_task(write_twilio()))
+                    writer_tasks.append(asyncio.create_task(playout.run(send_frame, send_mark)))
+                    writer_tasks.append(asyncio.create_task(write_ultravox()))
                     uv_task = asyncio.create_task(handle_ultravox())
-                    print("🎯 Ultravox handler task started")
+                    logger.info("🎯 Ultravox handler task started")
 
-                elif data.get('event') == 'media':
-                    payload_base64 = data['media']['payload']
-                    try:
-                        mu_law_bytes = base64.b64decode(payload_base64)
-                    except Exception as e:
-                        print(f"❌ Error decoding base64: {e}")
-                        continue
-
-                    try:
-                        pcm_bytes = audioop.ulaw2lin(mu_law_bytes, 2)
-                    except Exception as e:
-                        print(f"❌ Error transcoding µ-law to PCM: {e}")
-                        continue
+                elif event == 'mark':
+                    playout.on_mark(data.get('mark', {}).get('name'))
 
+                elif event == 'media':
+                    _frames_in.inc()
                     if ultravox_ws_active and uv_ws and uv_ws.state == websockets.protocol.State.OPEN:
-                        try:
-                            await uv_ws.send(pcm_bytes)
-                        except Exception as e:
-                            print(f"❌ Error sending PCM to Ultravox: {e}")
-                            ultravox_ws_active = False
+                        to_ultravox.put_audio(mu_law_bytes)
 
         except WebSocketDisconnect:
-            print(f"🔌 Twilio WebSocket disconnected (CallSid={call_sid})")
+            logger.info("🔌 Twilio WebSocket disconnected (CallSid=%s)", call_sid)
             twilio_ws_active = False
 
             if ultravox_ws_active and uv_ws and uv_ws.state == websockets.protocol.State.OPEN:
                 ultravox_ws_active = False
                 if session:
-                    session['ultravox_ws_active'] = False
-                    session['twilio_ws_active'] = False
+                    session.ultravox_ws_active = False
+                    session.twilio_ws_active = False
                 await safe_close_websocket(uv_ws, name="Ultravox WebSocket (Twilio disconnect)")
 
-            if session and not session.get('transcript_sent', False):
-                transcript_text = session.get("transcript", "").lower()
-                if "dock tour" in transcript_text and "confirmation email" in transcript_text:
-                    session["route"] = 3
-                    print("🧭 Route set to 3 based on transcript content")
+            if session and not session.transcript_sent:
+                session.flush_transcript()
+                route_from_transcript()
                 await send_transcript_to_n8n(session)
 
         except Exception as e:
-            print(f"❌ Error in handle_twilio: {e}")
-            traceback.print_exc()
+            logger.exception("❌ Error in handle_twilio: %s", e)
 
     twilio_task = asyncio.create_task(handle_twilio())
     try:
         await twilio_task
     except asyncio.CancelledError:
-        print("🛑 Twilio handler task cancelled")
+        logger.info("🛑 Twilio handler task cancelled")
     finally:
+        # The call context was set inside handle_twilio's task; teardown records need it here too
+        set_call_context(call_sid, stream_sid)
         twilio_ws_active = False
         ultravox_ws_active = False
 
+        if tool_runner:
+            # A hangUp in progress finishes on its own (bounded by its timeout)
+            tool_runner.cancel(keep=("hangUp",))
+        for task in list(action_tasks):
+            task.cancel()
+        playout.close()
+        logger.info("📊 Playout: %s", playout.stats())
+        for queue in (to_twilio, to_ultravox):
+            queue.close()
+        if writer_tasks:
+            # Let the writers flush what is already queued (final frames, marks), but not for long
+            _, pending = await asyncio.wait(writer_tasks, timeout=WRITER_DRAIN_TIMEOUT)
+            for task in pending:
+                task.cancel()
+        for queue in (to_twilio, to_ultravox):
+            logger.info("📊 Queue %s: %s", queue.name, queue.stats())
+
         if session:
-            session['twilio_ws_active'] = False
-            session['ultravox_ws_active'] = False
+            session.twilio_ws_active = False
+            session.ultravox_ws_active = False
 
         if uv_ws and uv_ws.state == websockets.protocol.State.OPEN:
             try:
                 await safe_close_websocket(uv_ws, name="Ultravox WebSocket (cleanup)")
             except Exception as e:
-                print(f"❌ Cleanup error: {e}")
+                logger.error("❌ Cleanup error: %s", e)
 
     if session and call_sid:
-        if not session.get('realtime_payload_sent', False) and not session.get('transcript_sent', False):
+        if not session.realtime_payload_sent and not session.transcript_sent:
             try:
-                transcript_text = session.get("transcript", "").lower()
-                if "dock tour" in transcript_text and "confirmation email" in transcript_text:
-                    session["route"] = 3
-                    print("🧭 Route set to 3 based on transcript content")
+                session.flush_transcript()
+                route_from_transcript()
                 await send_transcript_to_n8n(session)
             except Exception as e:
-                print(f"❌ Final transcript send error: {e}")
+                logger.error("❌ Final transcript send error: %s", e)
+
+        record = {"call_sid": call_sid, "stream_sid": stream_sid, **session.timeline.finish()}
+        logger.info("⏱️ Call timeline (ms): %s; %s turn(s), p50 %s ms, max %s ms", record["milestones_ms"],
+                    record["turns"], record["turn_p50_ms"], record["turn_max_ms"], extra={"data": record})
+
+        logger.info("🧹 Cleaning up session for CallSid=%s", call_sid)
+        sessions.remove(call_sid)
 
-            print(f"🧹 Cleaning up session for CallSid={call_sid}")
-            sessions.pop(call_sid, None)
+    if capture is not None:
+        await capture.close()
+        logger.info("📼 Capture written to %s", capture.path)
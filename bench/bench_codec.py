@@ -0,0 +1,85 @@
+"""
+Micro-benchmark: µ-law <-> PCM transcoding, audioop vs app.audio.codec.
+
+Reports 20 ms frames/sec on a single core for each direction, plus the number
+of concurrent calls that rate would carry (each call moves 50 frames/sec in
+each direction).
+
+    python -m bench.bench_codec [--seconds 2]
+"""
+import argparse
+import os
+import time
+import warnings
+
+from app.audio.codec import (
+    SAMPLES_PER_FRAME,
+    MuLawTranscoder,
+    pcm16_to_ulaw,
+    ulaw_to_pcm16,
+)
+
+try:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        import audioop
+except ImportError:  # Python >= 3.13
+    audioop = None
+
+FRAMES_PER_SEC_PER_CALL = 1000 // 20
+
+
+def _rate(fn, frame, seconds: float) -> float:
+    """Call fn(frame) repeatedly for ~`seconds` and return calls/sec."""
+    n = 0
+    batch = 1000
+    start = time.perf_counter()
+    deadline = start + seconds
+    while True:
+        for _ in range(batch):
+            fn(frame)
+        n += batch
+        now = time.perf_counter()
+        if now >= deadline:
+            return n / (now - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=2.0, help="time per case")
+    parser.add_argument("--batch-frames", type=int, default=50,
+                        help="frames per buffer for the batched cases")
+    args = parser.parse_args()
+
+    ulaw_frame = os.urandom(SAMPLES_PER_FRAME)
+    pcm_frame = os.urandom(SAMPLES_PER_FRAME * 2)
+    ulaw_batch = ulaw_frame * args.batch_frames
+    pcm_batch = pcm_frame * args.batch_frames
+    inbound = MuLawTranscoder()
+    outbound = MuLawTranscoder()
+
+    cases = []
+    if audioop is not None:
+        cases += [
+            ("audioop.ulaw2lin", lambda b: audioop.ulaw2lin(b, 2), ulaw_frame, 1),
+            ("audioop.lin2ulaw", lambda b: audioop.lin2ulaw(b, 2), pcm_frame, 1),
+        ]
+    cases += [
+        ("codec.ulaw_to_pcm16", ulaw_to_pcm16, ulaw_frame, 1),
+        ("codec.pcm16_to_ulaw", pcm16_to_ulaw, pcm_frame, 1),
+        ("MuLawTranscoder.decode", inbound.decode, ulaw_frame, 1),
+        ("MuLawTranscoder.encode", outbound.encode, pcm_frame, 1),
+        (f"MuLawTranscoder.decode x{args.batch_frames}", inbound.decode, ulaw_batch, args.batch_frames),
+        (f"MuLawTranscoder.encode x{args.batch_frames}", outbound.encode, pcm_batch, args.batch_frames),
+    ]
+
+    print(f"{'case':<34}{'frames/sec':>14}{'µs/frame':>10}{'calls/core':>12}")
+    for name, fn, frame, frames_per_call in cases:
+        fps = _rate(fn, frame, args.seconds) * frames_per_call
+        print(f"{name:<34}{fps:>14,.0f}{1e6 / fps:>10.2f}{fps / FRAMES_PER_SEC_PER_CALL:>12,.0f}")
+    if audioop is None:
+        print("(audioop not available on this interpreter; baseline skipped)")
+
+
+if __name__ == "__main__":
+    main()
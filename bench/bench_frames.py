@@ -0,0 +1,72 @@
+"""
+Micro-benchmark: Twilio media frame parsing / rendering, json+base64 vs
+app.websockets.twilio_frames.
+
+Inbound measures getting the µ-law bytes out of a raw `media` event; outbound
+measures turning a 20 ms µ-law frame into the JSON text sent to Twilio.
+
+    python -m bench.bench_frames [--seconds 2]
+"""
+import argparse
+import base64
+import json
+import os
+
+from app.audio.codec import SAMPLES_PER_FRAME
+from app.websockets.twilio_frames import MediaFrameEncoder, extract_media_payload
+from bench.bench_codec import FRAMES_PER_SEC_PER_CALL, _rate
+
+STREAM_SID = "MZ18ad3ab5a668481ce02b83e7395059f0"
+
+
+def _baseline_parse(message: str) -> bytes:
+    data = json.loads(message)
+    return base64.b64decode(data['media']['payload'])
+
+
+def _baseline_render(ulaw: bytes) -> str:
+    payload_base64 = base64.b64encode(ulaw).decode('ascii')
+    return json.dumps({
+        "event": "media",
+        "streamSid": STREAM_SID,
+        "media": {"payload": payload_base64}
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=2.0, help="time per case")
+    args = parser.parse_args()
+
+    ulaw_frame = os.urandom(SAMPLES_PER_FRAME)
+    # Shape of a real Twilio inbound media event
+    inbound = json.dumps({
+        "event": "media",
+        "sequenceNumber": "1234",
+        "media": {
+            "track": "inbound",
+            "chunk": "1233",
+            "timestamp": "24660",
+            "payload": base64.b64encode(ulaw_frame).decode('ascii'),
+        },
+        "streamSid": STREAM_SID,
+    }, separators=(",", ":"))
+    encoder = MediaFrameEncoder(STREAM_SID)
+    assert extract_media_payload(inbound) == _baseline_parse(inbound)
+    assert json.loads(encoder.render(ulaw_frame)) == json.loads(_baseline_render(ulaw_frame))
+
+    cases = [
+        ("inbound json.loads+b64decode", _baseline_parse, inbound),
+        ("inbound extract_media_payload", extract_media_payload, inbound),
+        ("outbound b64encode+json.dumps", _baseline_render, ulaw_frame),
+        ("outbound MediaFrameEncoder", encoder.render, ulaw_frame),
+    ]
+
+    print(f"{'case':<34}{'frames/sec':>14}{'µs/frame':>10}{'calls/core':>12}")
+    for name, fn, frame in cases:
+        fps = _rate(fn, frame, args.seconds)
+        print(f"{name:<34}{fps:>14,.0f}{1e6 / fps:>10.2f}{fps / FRAMES_PER_SEC_PER_CALL:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Local stand-in for the n8n webhook.
+
+Point the app at it with N8N_WEBHOOK_URL=http://127.0.0.1:8013/webhook.
+Route 1 (caller profile) answers with a firstMessage greeting; every other
+route, and batched deliveries, get {"message": "ok"}. --latency (plus up to
+--jitter) delays every answer; --fail-rate answers a fraction with a 500.
+
+    python -m bench.fake_n8n [--port 8013] [--latency 0.2] [--jitter 0] [--fail-rate 0]
+"""
+import argparse
+import asyncio
+import random
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI(title="Fake n8n webhook")
+app.state.latency = 0.2
+app.state.jitter = 0.0
+app.state.fail_rate = 0.0
+app.state.requests = 0
+
+GREETING = {"firstMessage": {"message": {"content": "Hi, thanks for calling F3 Marina. How can I help you today?"}}}
+
+
+@app.post("/{path:path}")
+async def webhook(path: str, request: Request):
+    payload = await request.json()
+    app.state.requests += 1
+    await asyncio.sleep(app.state.latency + random.random() * app.state.jitter)
+    if random.random() < app.state.fail_rate:
+        return JSONResponse(status_code=500, content={"message": "fake failure"})
+    if isinstance(payload, dict) and str(payload.get("route")) == "1":
+        return GREETING
+    return {"message": "ok"}
+
+
+@app.head("/")
+@app.get("/")
+async def root():
+    return {"requests": app.state.requests}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8013)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before answering")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random delay, up to this many seconds")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with a 500")
+    args = parser.parse_args()
+    app.state.latency = args.latency
+    app.state.jitter = args.jitter
+    app.state.fail_rate = args.fail_rate
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Local stand-in for the Twilio REST API's call-control endpoint.
+
+Point the app at it with TWILIO_API_BASE_URL=http://127.0.0.1:8011 to run
+hangUp without touching Twilio. CallSids not starting with CA get Twilio's
+404; --delay simulates a slow API.
+
+    python -m bench.fake_twilio [--port 8011] [--delay 0]
+"""
+import argparse
+import asyncio
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI(title="Fake Twilio REST API")
+app.state.delay = 0.0
+app.state.updates = []
+
+
+@app.post("/2010-04-01/Accounts/{account_sid}/Calls/{call_sid}.json")
+async def update_call(account_sid: str, call_sid: str, request: Request):
+    form = dict(await request.form())
+    if app.state.delay:
+        await asyncio.sleep(app.state.delay)
+    app.state.updates.append((call_sid, form))
+    print(f"📴 [fake twilio] {call_sid} <- {form}")
+    if not call_sid.startswith("CA"):
+        return JSONResponse(
+            status_code=404,
+            content={"code": 20404, "message": f"The requested resource {request.url.path} was not found", "status": 404},
+        )
+    return {"sid": call_sid, "account_sid": account_sid, "status": form.get("Status", "in-progress")}
+
+
+@app.head("/")
+@app.get("/")
+async def root():
+    return {"updates": len(app.state.updates)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds before answering")
+    args = parser.parse_args()
+    app.state.delay = args.delay
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
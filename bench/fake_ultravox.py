@@ -0,0 +1,188 @@
+"""
+Local stand-in for the Ultravox API: call creation and the serverWebSocket.
+
+Point the app at it with ULTRAVOX_API_URL=http://127.0.0.1:8012. Every call
+greets with --greeting-s of agent audio, then answers each caller turn: it
+detects the end of the caller's speech from the audio energy, sends the
+user transcript and "thinking" state, invokes a client tool every
+--tool-every turns, and replies with --reply-s of audio (or, with --echo,
+the caller's own audio). Agent audio is s16le PCM paced in real time.
+
+    python -m bench.fake_ultravox [--port 8012] [--create-delay 0] [--echo]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+import uuid
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request, WebSocket
+
+app = FastAPI(title="Fake Ultravox API")
+app.state.args = None
+app.state.calls = {}
+
+SPEECH_RMS = 500  # s16 RMS above which an inbound chunk counts as speech
+
+
+def _tone(seconds: float, rate: int, freq: float = 220.0) -> bytes:
+    t = np.arange(int(seconds * rate)) / rate
+    return (np.sin(2 * np.pi * freq * t) * 6000).astype("<i2").tobytes()
+
+
+@app.post("/api/calls")
+async def create_call(request: Request):
+    body = await request.json()
+    args = app.state.args
+    if args.create_delay:
+        await asyncio.sleep(args.create_delay)
+    call_id = str(uuid.uuid4())
+    app.state.calls[call_id] = body
+    host = request.headers.get("host", f"127.0.0.1:{args.port}")
+    return {"callId": call_id, "joinUrl": f"ws://{host}/calls/{call_id}/ws", "created": time.time()}
+
+
+class FakeAgent:
+    """One joined call: speaks, listens for turn ends and runs tool round-trips."""
+
+    def __init__(self, ws: WebSocket, args, rate: int):
+        self.ws = ws
+        self.args = args
+        self.rate = rate
+        self.chunk_bytes = int(rate * args.chunk_ms / 1000) * 2
+        self.ordinals = itertools.count()
+        self.turn_ended = asyncio.Event()
+        self.tool_results = {}
+        self.heard = bytearray()  # caller audio of the current turn, for --echo
+        self.speaking = False
+        self.silent_s = 0.0
+        self.turns = 0
+
+    async def send_json(self, message: dict):
+        await self.ws.send_text(json.dumps(message))
+
+    async def speak(self, pcm: bytes, text: str):
+        await self.send_json({"type": "state", "state": "speaking"})
+        ordinal = next(self.ordinals)
+        for word in text.split():
+            await self.send_json({"type": "transcript", "role": "agent", "delta": word + " ", "final": False, "ordinal": ordinal})
+        loop = asyncio.get_running_loop()
+        next_at = loop.time()
+        chunk_s = self.args.chunk_ms / 1000
+        for start in range(0, len(pcm), self.chunk_bytes):
+            await self.ws.send_bytes(pcm[start:start + self.chunk_bytes])
+            next_at += chunk_s
+            await asyncio.sleep(max(0.0, next_at - loop.time()))
+        await self.send_json({"type": "transcript", "role": "agent", "text": text, "final": True, "ordinal": ordinal})
+        await self.send_json({"type": "state", "state": "listening"})
+
+    async def call_tool(self):
+        invocation_id = str(uuid.uuid4())
+        waiter = self.tool_results[invocation_id] = asyncio.get_running_loop().create_future()
+        await self.send_json({
+            "type": "client_tool_invocation",
+            "toolName": self.args.tool,
+            "invocationId": invocation_id,
+            "parameters": {"full_name": "Load Test", "date_of_birth": "1990-01-01", "policy_number": "LT-1"},
+        })
+        try:
+            await asyncio.wait_for(waiter, timeout=10)
+        except asyncio.TimeoutError:
+            print(f"⚠️ [fake ultravox] no result for {self.args.tool} ({invocation_id})")
+        finally:
+            self.tool_results.pop(invocation_id, None)
+
+    def hear(self, pcm: bytes):
+        samples = np.frombuffer(pcm[:len(pcm) // 2 * 2], dtype="<i2").astype(np.float32)
+        loud = samples.size and float(np.sqrt(np.mean(samples * samples))) > SPEECH_RMS
+        if loud:
+            self.speaking = True
+            self.silent_s = 0.0
+        elif self.speaking:
+            self.silent_s += samples.size / self.rate
+            if self.silent_s * 1000 >= self.args.eos_ms:
+                self.speaking = False
+                self.turn_ended.set()
+        if self.speaking and self.args.echo:
+            self.heard += pcm
+
+    async def listen(self):
+        while True:
+            message = await self.ws.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes") is not None:
+                self.hear(message["bytes"])
+            elif message.get("text") is not None:
+                data = json.loads(message["text"])
+                if data.get("type") == "client_tool_result":
+                    waiter = self.tool_results.get(data.get("invocationId"))
+                    if waiter and not waiter.done():
+                        waiter.set_result(data)
+
+    async def converse(self):
+        await self.speak(_tone(self.args.greeting_s, self.rate), "Hi, thanks for calling. How can I help you today?")
+        while True:
+            await self.turn_ended.wait()
+            self.turn_ended.clear()
+            self.turns += 1
+            await self.send_json({"type": "transcript", "role": "user", "text": f"Caller turn {self.turns}", "final": True,
+                                  "ordinal": next(self.ordinals)})
+            await self.send_json({"type": "state", "state": "thinking"})
+            if self.args.think_ms:
+                await asyncio.sleep(self.args.think_ms / 1000)
+            if self.args.tool_every and self.turns % self.args.tool_every == 0:
+                await self.call_tool()
+            if self.args.echo and self.heard:
+                reply, self.heard = bytes(self.heard), bytearray()
+            else:
+                reply = _tone(self.args.reply_s, self.rate, 330.0)
+            await self.speak(reply, f"Here is my answer to turn {self.turns}.")
+
+
+@app.websocket("/calls/{call_id}/ws")
+async def join_call(ws: WebSocket, call_id: str):
+    body = app.state.calls.pop(call_id, None)
+    if body is None:
+        await ws.close(code=4404)
+        return
+    await ws.accept()
+    rate = body.get("medium", {}).get("serverWebSocket", {}).get("outputSampleRate", 8000)
+    agent = FakeAgent(ws, app.state.args, rate)
+    tasks = [asyncio.create_task(agent.listen()), asyncio.create_task(agent.converse())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+@app.head("/")
+@app.get("/")
+async def root():
+    return {"pending_calls": len(app.state.calls)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8012)
+    parser.add_argument("--create-delay", type=float, default=0.0, help="seconds before POST /api/calls answers")
+    parser.add_argument("--greeting-s", type=float, default=2.0, help="seconds of greeting audio")
+    parser.add_argument("--reply-s", type=float, default=2.0, help="seconds of audio per reply")
+    parser.add_argument("--chunk-ms", type=int, default=60, help="agent audio per binary message")
+    parser.add_argument("--eos-ms", type=int, default=400, help="silence that ends a caller turn")
+    parser.add_argument("--think-ms", type=int, default=300, help="delay before replying")
+    parser.add_argument("--tool", default="verify", help="client tool to invoke")
+    parser.add_argument("--tool-every", type=int, default=3, help="invoke the tool every N turns (0 = never)")
+    parser.add_argument("--echo", action="store_true", help="reply with the caller's own audio")
+    args = parser.parse_args()
+    app.state.args = args
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+Load driver: N simulated Twilio calls against /incoming-call and /media-stream.
+
+Each call POSTs the Twilio webhook, opens the media stream, and sends 20 ms
+µ-law frames in real time: --listen-s of silence, then --talk-s of speech,
+repeated. Marks are echoed back when the audio before them would have
+finished playing, as Twilio does. For every step of --calls, the calls run
+concurrently for --duration seconds. Each step reports:
+- time to first agent audio
+- caller end-of-speech to agent audio
+- inter-arrival gaps of agent frames, and playout underruns (glitches)
+- the server's CPU and peak RSS (Linux /proc, with --spawn or --server-pid)
+
+--spawn starts the app and the local fakes (bench.fake_ultravox,
+bench.fake_n8n, bench.fake_twilio) on ports 8010-8013 and points the app
+at them.
+
+    python -m bench.load_driver --spawn [--calls 1,10,25,50] [--duration 30]
+    python -m bench.load_driver --url http://127.0.0.1:8000 --server-pid <pid>
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+import numpy as np
+import websockets
+
+from app.audio.codec import SAMPLE_RATE, SAMPLES_PER_FRAME, pcm16_to_ulaw
+
+FRAME_S = 0.02
+SPURT_GAP_S = 0.2  # agent frames further apart than this start a new spurt
+ULAW_SILENCE = b"\xff" * SAMPLES_PER_FRAME
+
+APP_PORT, TWILIO_PORT, ULTRAVOX_PORT, N8N_PORT = 8010, 8011, 8012, 8013
+
+
+def _speech_frames(seconds: float) -> list:
+    """Voiced-sounding µ-law frames: a warbling tone with noise."""
+    rng = np.random.default_rng(7)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    pcm = np.sin(2 * np.pi * (180 + 40 * np.sin(2 * np.pi * 3 * t)) * t) * 5000 + rng.normal(0, 600, t.size)
+    ulaw = pcm16_to_ulaw(pcm.astype("<i2").tobytes())
+    return [ulaw[i:i + SAMPLES_PER_FRAME] for i in range(0, len(ulaw) - SAMPLES_PER_FRAME + 1, SAMPLES_PER_FRAME)]
+
+
+def _pct(values, q: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _ms(value) -> str:
+    return "-" if value is None else f"{value * 1000:.0f}"
+
+
+class SimulatedCall:
+    """One fake Twilio call: webhook, media stream, paced caller audio, agent audio accounting."""
+
+    def __init__(self, index: int, args, speech: list):
+        self.index = index
+        self.args = args
+        self.speech = speech
+        self.call_sid = "CA" + uuid.uuid4().hex
+        self.stream_sid = "MZ" + uuid.uuid4().hex
+        self.ttfa = None
+        self.turns = []
+        self.gaps = []
+        self.glitches = 0
+        self.frames_in = 0
+        self.frames_out = 0
+        self.error = None
+        self._ws = None
+        self._last_arrival = None
+        self._play_end = 0.0
+        self._talk_ended = None
+
+    def _frame(self, payload: bytes, chunk: int) -> str:
+        return json.dumps({
+            "event": "media",
+            "sequenceNumber": str(chunk + 2),
+            "media": {"track": "inbound", "chunk": str(chunk + 1), "timestamp": str(chunk * 20),
+                      "payload": base64.b64encode(payload).decode("ascii")},
+            "streamSid": self.stream_sid,
+        }, separators=(",", ":"))
+
+    async def run(self, http: httpx.AsyncClient, ws_url: str):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            resp = await http.post("/incoming-call", data={"CallSid": self.call_sid, "From": f"+1555{self.index:07d}"})
+            found = re.search(r'name="firstMessage" value="([^"]*)"', resp.text)
+            first_message = found.group(1) if found else "Hello"
+            async with websockets.connect(ws_url, max_size=None) as ws:
+                self._ws = ws
+                await ws.send(json.dumps({"event": "connected", "protocol": "Call", "version": "1.0.0"}))
+                await ws.send(json.dumps({"event": "start", "sequenceNumber": "1", "streamSid": self.stream_sid, "start": {
+                    "streamSid": self.stream_sid, "callSid": self.call_sid, "tracks": ["inbound"],
+                    "mediaFormat": {"encoding": "audio/x-mulaw", "sampleRate": 8000, "channels": 1},
+                    "customParameters": {"firstMessage": first_message, "callerNumber": f"+1555{self.index:07d}",
+                                         "callSid": self.call_sid},
+                }}))
+                receiver = asyncio.create_task(self._receive(started))
+                try:
+                    await self._send(loop.time() + self.args.duration)
+                    await ws.send(json.dumps({"event": "stop", "streamSid": self.stream_sid,
+                                              "stop": {"callSid": self.call_sid}}))
+                finally:
+                    receiver.cancel()
+                    await asyncio.gather(receiver, return_exceptions=True)
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+
+    async def _send(self, until: float):
+        loop = asyncio.get_running_loop()
+        listen = int(self.args.listen_s / FRAME_S)
+        talk = min(len(self.speech), int(self.args.talk_s / FRAME_S))
+        next_at = loop.time()
+        chunk = 0
+        while next_at < until:
+            phase = chunk % (listen + talk)
+            speaking = phase >= listen
+            await self._ws.send(self._frame(self.speech[phase - listen] if speaking else ULAW_SILENCE, chunk))
+            self.frames_out += 1
+            if speaking and phase == listen + talk - 1:
+                self._talk_ended = loop.time()
+            chunk += 1
+            next_at += FRAME_S
+            await asyncio.sleep(max(0.0, next_at - loop.time()))
+
+    async def _receive(self, started: float):
+        loop = asyncio.get_running_loop()
+        async for message in self._ws:
+            data = json.loads(message)
+            event = data.get("event")
+            now = loop.time()
+            if event == "media":
+                self.frames_in += 1
+                if self.ttfa is None:
+                    self.ttfa = now - started
+                if self._talk_ended is not None:
+                    self.turns.append(now - self._talk_ended)
+                    self._talk_ended = None
+                if self._last_arrival is not None and now - self._last_arrival < SPURT_GAP_S:
+                    self.gaps.append(now - self._last_arrival)
+                    if now > self._play_end + 0.001:
+                        self.glitches += 1
+                self._last_arrival = now
+                self._play_end = max(self._play_end, now) + FRAME_S
+            elif event == "mark":
+                # Twilio reports a mark once everything sent before it has played
+                loop.call_at(max(now, self._play_end), self._echo_mark, data["mark"]["name"])
+            elif event == "clear":
+                self._play_end = now
+
+    def _echo_mark(self, name: str):
+        asyncio.ensure_future(self._send_quietly(json.dumps({
+            "event": "mark", "streamSid": self.stream_sid, "mark": {"name": name}})))
+
+    async def _send_quietly(self, message: str):
+        try:
+            await self._ws.send(message)
+        except websockets.ConnectionClosed:
+            pass
+
+
+class ProcSampler:
+    """CPU time and resident memory of a server process, from /proc."""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.ticks = os.sysconf("SC_CLK_TCK")
+        self.page = os.sysconf("SC_PAGE_SIZE")
+
+    def cpu_seconds(self) -> float:
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self.ticks
+
+    def rss_bytes(self) -> int:
+        with open(f"/proc/{self.pid}/statm") as f:
+            return int(f.read().split()[1]) * self.page
+
+
+async def run_step(n: int, args, speech: list, sampler):
+    calls = [SimulatedCall(i, args, speech) for i in range(n)]
+    ws_url = args.url.replace("http", "ws", 1) + "/media-stream"
+    peak_rss = 0
+    cpu_start = sampler.cpu_seconds() if sampler else None
+    started = time.monotonic()
+    limits = httpx.Limits(max_connections=max(10, n))
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30) as http:
+        tasks = []
+        for call in calls:
+            tasks.append(asyncio.create_task(call.run(http, ws_url)))
+            await asyncio.sleep(args.stagger)
+        pending = set(tasks)
+        while pending:
+            _, pending = await asyncio.wait(pending, timeout=1.0)
+            if sampler:
+                peak_rss = max(peak_rss, sampler.rss_bytes())
+    elapsed = time.monotonic() - started
+
+    ok = [c for c in calls if c.error is None and c.ttfa is not None]
+    turns = [t for c in ok for t in c.turns]
+    gaps = [g for c in ok for g in c.gaps]
+    cpu = f"{(sampler.cpu_seconds() - cpu_start) / elapsed * 100:.0f}" if sampler else "-"
+    rss = f"{peak_rss / 2**20:.0f}" if sampler else "-"
+    print(f"{n:>6}{len(ok):>5}{_ms(_pct([c.ttfa for c in ok], 0.5)):>9}{_ms(_pct([c.ttfa for c in ok], 0.95)):>9}"
+          f"{_ms(_pct(turns, 0.5)):>9}{_ms(_pct(turns, 0.95)):>9}{_ms(_pct(gaps, 0.99)):>9}"
+          f"{sum(c.glitches for c in ok):>9}{cpu:>7}{rss:>8}")
+    for call in calls:
+        if call.error:
+            print(f"   ❌ call {call.index} ({call.call_sid}): {call.error}")
+            break
+
+
+def spawn(args, fakes=("ultravox", "n8n", "twilio"), env_overrides=None) -> list:
+    """Start the fakes and the app, wired to each other. Returns the processes, app last."""
+    env = dict(os.environ)
+    env.update({
+        "ULTRAVOX_API_URL": f"http://127.0.0.1:{ULTRAVOX_PORT}",
+        "ULTRAVOX_API_KEY": "bench",
+        "N8N_WEBHOOK_URL": f"http://127.0.0.1:{N8N_PORT}/webhook",
+        "TWILIO_API_BASE_URL": f"http://127.0.0.1:{TWILIO_PORT}",
+        "TWILIO_ACCOUNT_SID": "ACbench",
+        "TWILIO_AUTH_TOKEN": "bench",
+        "PUBLIC_URL": f"http://127.0.0.1:{APP_PORT}",
+        "OUTBOX_PATH": os.path.join(tempfile.mkdtemp(prefix="bench-outbox-"), "outbox.sqlite3"),
+        "LOG_LEVEL": env.get("LOG_LEVEL", "WARNING"),
+    })
+    env.update(env_overrides or {})
+    fake_commands = {
+        "ultravox": [sys.executable, "-m", "bench.fake_ultravox", "--port", str(ULTRAVOX_PORT)],
+        "n8n": [sys.executable, "-m", "bench.fake_n8n", "--port", str(N8N_PORT), "--latency", str(args.n8n_latency)],
+        "twilio": [sys.executable, "-m", "bench.fake_twilio", "--port", str(TWILIO_PORT)],
+    }
+    commands = [fake_commands[name] for name in fakes] + [
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(APP_PORT),
+         "--log-level", "warning"],
+    ]
+    quiet = {"stdout": subprocess.DEVNULL}
+    procs = [subprocess.Popen(cmd, env=env, **quiet) for cmd in commands]
+    args.url = f"http://127.0.0.1:{APP_PORT}"
+    return procs
+
+
+async def wait_ready(urls, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=1.0) as http:
+        for url in urls:
+            while True:
+                try:
+                    await http.get(url)
+                    break
+                except httpx.TransportError:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+                    await asyncio.sleep(0.2)
+
+
+async def main_async(args, procs):
+    if procs:
+        await wait_ready([f"http://127.0.0.1:{port}/" for port in (ULTRAVOX_PORT, N8N_PORT, TWILIO_PORT, APP_PORT)])
+    pid = args.server_pid or (procs[-1].pid if procs else None)
+    sampler = ProcSampler(pid) if pid and os.path.exists(f"/proc/{pid}") else None
+    speech = _speech_frames(args.talk_s)
+
+    print(f"{'calls':>6}{'ok':>5}{'ttfa50':>9}{'ttfa95':>9}{'turn50':>9}{'turn95':>9}{'gap99':>9}"
+          f"{'glitch':>9}{'cpu%':>7}{'rssMB':>8}")
+    for n in (int(x) for x in args.calls.split(",")):
+        await run_step(n, args, speech, sampler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default=f"http://127.0.0.1:{APP_PORT}", help="app base URL")
+    parser.add_argument("--spawn", action="store_true", help="start the app and the fakes locally")
+    parser.add_argument("--server-pid", type=int, help="app process to sample CPU/RSS from")
+    parser.add_argument("--calls", default="1,10,25,50", help="comma-separated concurrent call counts")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per call")
+    parser.add_argument("--stagger", type=float, default=0.02, help="seconds between call starts")
+    parser.add_argument("--listen-s", type=float, default=4.0, help="caller silence per turn")
+    parser.add_argument("--talk-s", type=float, default=1.5, help="caller speech per turn")
+    parser.add_argument("--n8n-latency", type=float, default=0.2, help="fake n8n latency (--spawn)")
+    args = parser.parse_args()
+
+    procs = spawn(args) if args.spawn else []
+    try:
+        asyncio.run(main_async(args, procs))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for proc in reversed(procs):
+            proc.terminate()
+        for proc in procs:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Replay a media capture through the app against fake peers.
+
+Captures are written per call when the app runs with MEDIA_CAPTURE_DIR set.
+The recorded Twilio messages are played into /media-stream, and the recorded
+Ultravox messages are served by a local Ultravox stand-in that the app joins.
+Playback runs at the recorded pace (--speed 1), faster (--speed 4), or as fast
+as possible (--speed 0). Each run reports the following, next to the values
+recorded in the capture:
+- time to first agent audio
+- agent frames forwarded to Twilio
+- p99 gap between agent frames
+- the server's CPU time
+
+The app still paces agent audio in real time. At higher speeds, fewer frames
+are therefore forwarded before the capture runs out.
+
+With --max-ttfa-ms, the tool exits non-zero when any run is slower than
+that, so it can gate CI. With --spawn, it starts the app (plus fake n8n and
+Twilio) pointed at the stand-in. Otherwise, run the app yourself with
+ULTRAVOX_API_URL=http://127.0.0.1:8012.
+
+    python -m bench.replay CAPTURE.gcap [--spawn] [--speed 1] [--repeat 1] [--max-ttfa-ms N]
+"""
+import argparse
+import asyncio
+import base64
+import os
+import subprocess
+import sys
+import uuid
+
+import httpx
+import uvicorn
+import websockets
+from fastapi import FastAPI, Request, WebSocket
+
+from app.utils.capture import read_capture, TWILIO_IN, TWILIO_OUT, ULTRAVOX_IN, BINARY, MEDIA
+from bench.load_driver import APP_PORT, N8N_PORT, TWILIO_PORT, ULTRAVOX_PORT, ProcSampler, spawn, wait_ready, _pct, _ms
+
+uv_app = FastAPI(title="Replay Ultravox stand-in")
+uv_app.state.run = None
+
+
+class Replay:
+    """One playback of a capture, with fresh SIDs so runs never collide in the app."""
+
+    def __init__(self, header: dict, records: list, speed: float):
+        self.speed = speed
+        self.old_sids = (header["call_sid"], header["stream_sid"])
+        self.call_sid = "CA" + uuid.uuid4().hex
+        self.stream_sid = "MZ" + uuid.uuid4().hex
+        self.twilio_in = [(t, kind, data) for t, source, kind, data in records if source == TWILIO_IN]
+        self.ultravox_in = [(t, kind, data) for t, source, kind, data in records if source == ULTRAVOX_IN]
+        self.t0 = None
+        self.ttfa = None
+        self.frames = 0
+        self.gaps = []
+        self.cpu = None
+        self._last_frame = None
+
+    def rewrite(self, text: str) -> str:
+        return text.replace(self.old_sids[0], self.call_sid).replace(self.old_sids[1], self.stream_sid)
+
+    async def wait_until(self, offset: float):
+        if self.speed:
+            loop = asyncio.get_running_loop()
+            await asyncio.sleep(max(0.0, self.t0 + offset / self.speed - loop.time()))
+
+    async def play_twilio(self, ws):
+        for offset, kind, data in self.twilio_in:
+            await self.wait_until(offset)
+            if kind == MEDIA:
+                await ws.send('{"event":"media","streamSid":"%s","media":{"track":"inbound","payload":"%s"}}'
+                              % (self.stream_sid, base64.b64encode(data).decode("ascii")))
+            else:
+                await ws.send(self.rewrite(data.decode()))
+
+    async def read_twilio(self, ws):
+        loop = asyncio.get_running_loop()
+        async for message in ws:
+            if not message.startswith('{"event":"media"'):
+                continue
+            now = loop.time()
+            self.frames += 1
+            if self.ttfa is None:
+                self.ttfa = now - self.t0
+            if self._last_frame is not None:
+                self.gaps.append(now - self._last_frame)
+            self._last_frame = now
+
+    async def play_ultravox(self, ws: WebSocket):
+        for offset, kind, data in self.ultravox_in:
+            await self.wait_until(offset)
+            if kind == BINARY:
+                await ws.send_bytes(data)
+            else:
+                await ws.send_text(self.rewrite(data.decode()))
+
+
+@uv_app.post("/api/calls")
+async def create_call(request: Request):
+    await request.body()
+    host = request.headers.get("host", f"127.0.0.1:{ULTRAVOX_PORT}")
+    return {"callId": str(uuid.uuid4()), "joinUrl": f"ws://{host}/replay/ws"}
+
+
+@uv_app.websocket("/replay/ws")
+async def join(ws: WebSocket):
+    await ws.accept()
+    run = uv_app.state.run
+    if run is None:
+        await ws.close()
+        return
+    player = asyncio.create_task(run.play_ultravox(ws))
+    try:
+        while (await ws.receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        player.cancel()
+        await asyncio.gather(player, return_exceptions=True)
+
+
+def recorded_stats(records: list) -> dict:
+    """What the capture itself says about the agent audio sent to Twilio."""
+    frames = [t for t, source, kind, _ in records if source == TWILIO_OUT and kind == MEDIA]
+    return {
+        "ttfa": frames[0] if frames else None,
+        "frames": len(frames),
+        "gap99": _pct([b - a for a, b in zip(frames, frames[1:])], 0.99),
+    }
+
+
+async def run_once(args, header, records, sampler) -> Replay:
+    run = uv_app.state.run = Replay(header, records, args.speed)
+    async with httpx.AsyncClient(base_url=args.url, timeout=30) as http:
+        await http.post("/incoming-call", data={"CallSid": run.call_sid, "From": "+15550000000"})
+    cpu_start = sampler.cpu_seconds() if sampler else None
+    ws_url = args.url.replace("http", "ws", 1) + "/media-stream"
+    async with websockets.connect(ws_url, max_size=None) as ws:
+        run.t0 = asyncio.get_running_loop().time()
+        reader = asyncio.create_task(run.read_twilio(ws))
+        try:
+            await run.play_twilio(ws)
+            await asyncio.sleep(args.tail_s)
+        finally:
+            reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
+    run.cpu = sampler.cpu_seconds() - cpu_start if sampler else None
+    uv_app.state.run = None
+    return run
+
+
+async def main_async(args, procs) -> int:
+    header, records = read_capture(args.capture)
+    recorded = recorded_stats(records)
+    server = uvicorn.Server(uvicorn.Config(uv_app, host="127.0.0.1", port=args.uv_port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    try:
+        urls = [f"http://127.0.0.1:{args.uv_port}/"]
+        urls += [f"http://127.0.0.1:{port}/" for port in (N8N_PORT, TWILIO_PORT, APP_PORT)] if procs else [args.url + "/"]
+        await wait_ready(urls)
+        pid = args.server_pid or (procs[-1].pid if procs else None)
+        sampler = ProcSampler(pid) if pid and os.path.exists(f"/proc/{pid}") else None
+
+        span = records[-1][0] if records else 0.0
+        print(f"📼 {args.capture}: CallSid {header['call_sid']}, {len(records)} messages over {span:.1f}s")
+        print(f"{'run':>4}{'ttfa ms':>16}{'frames':>16}{'gap99 ms':>16}{'cpu s':>8}")
+        failed = False
+        for i in range(args.repeat):
+            run = await run_once(args, header, records, sampler)
+            print(f"{i + 1:>4}{_ms(recorded['ttfa']) + ' → ' + _ms(run.ttfa):>16}"
+                  f"{str(recorded['frames']) + ' → ' + str(run.frames):>16}"
+                  f"{_ms(recorded['gap99']) + ' → ' + _ms(_pct(run.gaps, 0.99)):>16}"
+                  f"{'-' if run.cpu is None else f'{run.cpu:.2f}':>8}")
+            if args.max_ttfa_ms and (run.ttfa is None or run.ttfa * 1000 > args.max_ttfa_ms):
+                failed = True
+        if failed:
+            print(f"❌ time to first audio exceeded {args.max_ttfa_ms:.0f} ms")
+        return 1 if failed else 0
+    finally:
+        server.should_exit = True
+        await serving
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("capture", help="a .gcap file from MEDIA_CAPTURE_DIR")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{APP_PORT}", help="app base URL")
+    parser.add_argument("--spawn", action="store_true", help="start the app (and fake n8n/Twilio) locally")
+    parser.add_argument("--server-pid", type=int, help="app process to sample CPU from")
+    parser.add_argument("--uv-port", type=int, default=ULTRAVOX_PORT, help="port of the Ultravox stand-in")
+    parser.add_argument("--speed", type=float, default=1.0, help="playback speed; 0 = as fast as possible")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--tail-s", type=float, default=1.0, help="seconds to keep listening after the last message")
+    parser.add_argument("--max-ttfa-ms", type=float, default=0, help="fail if time to first audio exceeds this")
+    parser.add_argument("--n8n-latency", type=float, default=0.2, help="fake n8n latency (--spawn)")
+    args = parser.parse_args()
+
+    procs = spawn(args, fakes=("n8n", "twilio"),
+                  env_overrides={"ULTRAVOX_API_URL": f"http://127.0.0.1:{args.uv_port}"}) if args.spawn else []
+    status = 1
+    try:
+        status = asyncio.run(main_async(args, procs))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for proc in reversed(procs):
+            proc.terminate()
+        for proc in procs:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()